@@ -2,20 +2,30 @@ from flask import send_from_directory
 import os
 import sqlite3
 import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 try:
     from zoneinfo import ZoneInfo
 except Exception:
     ZoneInfo = None
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-from functools import wraps
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response, stream_with_context, g, has_request_context
+from functools import lru_cache, wraps
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import click
 import requests
+import bisect
+import csv
+import io
 import json
+import mmap
+import struct
 import time
 import hashlib
 import secrets
+import unicodedata
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # -------------------- Flask --------------------
@@ -49,6 +59,31 @@ def _jinja2_filter_datetime(date_string, format='%d.%m.%Y'):
     except Exception:
         return date_string
 
+# -------------------- Sürümlü statik dosyalar --------------------
+# Şablonlar CSS/JS'i static_url() ile bağlar: URL'ye içerik hash'i (?v=...)
+# eklenir, böylece tarayıcı dosyayı süresiz önbelleğe alabilir; dosya
+# değişince hash ve dolayısıyla URL de değişir.
+STATIC_ASSET_MAX_AGE = 31536000
+
+@lru_cache(maxsize=64)
+def _static_file_version(filename):
+    try:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()[:10]
+    except OSError:
+        return None
+
+@app.template_global('static_url')
+def static_url(filename):
+    v = _static_file_version(filename)
+    return url_for('static', filename=filename, v=v) if v else url_for('static', filename=filename)
+
+@app.after_request
+def _cache_versioned_static(resp):
+    if request.endpoint == 'static' and request.args.get('v') and resp.status_code == 200:
+        resp.headers['Cache-Control'] = f'public, max-age={STATIC_ASSET_MAX_AGE}, immutable'
+    return resp
+
 # Favicon ve Apple Touch Icon rotaları
 @app.route('/favicon.ico')
 def favicon():
@@ -105,44 +140,139 @@ def stats_login():
         error_msg = "Falscher Benutzername oder falsches Passwort."
     else:
         error_msg = None
-    error_html = f"<div class='err'>{error_msg}</div>" if error_msg else ""
-    return (
-        f"""
-        <!DOCTYPE html>
-        <html><head><meta charset='UTF-8'><meta name='viewport' content='width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no, viewport-fit=cover'>
-        <meta name='apple-mobile-web-app-capable' content='yes'>
-        <title>Stats Login</title>
-        <style>
-            * {{ margin:0; padding:0; box-sizing:border-box; }}
-            html, body {{ height:100%; overflow:hidden; }}
-            body {{ font-family: system-ui, -apple-system, sans-serif; display:flex; align-items:center; justify-content:center; background:#f5f6fa; padding:16px; }}
-            .box {{ background:#fff; padding:24px; border-radius:12px; box-shadow:0 10px 30px rgba(0,0,0,.08); width:100%; max-width:360px; }}
-            h2 {{ margin:0 0 16px; font-size:1.2em; color:#333; text-align:center; }}
-            .row {{ margin:10px 0; }}
-            input {{ width:100%; padding:12px; font-size:16px; border:1px solid #ddd; border-radius:8px; }}
-            button {{ width:100%; padding:12px; border:none; border-radius:8px; background:#667eea; color:#fff; font-weight:600; cursor:pointer; }}
-            button:active {{ background:#5568d3; }}
-            .err {{ color:#dc3545; font-size:.9em; margin-bottom:10px; text-align:center; }}
-            @media (max-height:600px) {{ .box {{ padding:16px; }} h2 {{ font-size:1.1em; margin-bottom:12px; }} }}
-        </style></head><body>
-        <div class='box'>
-            <h2>🔒 Stats Login</h2>
-            {error_html}
-            <form method='post' autocomplete='on'>
-                <div class='row'><input type='text' name='username' placeholder='Benutzername' value='{request.form.get('username','')}' autocomplete='username' required></div>
-                <div class='row'><input type='password' name='password' placeholder='Passwort' autocomplete='current-password' required></div>
-                <div class='row'><button type='submit'>Anmelden</button></div>
-            </form>
-        </div>
-        </body></html>
-        """
-    )
+    return render_template('stats_login.html', error_msg=error_msg,
+                           username=request.form.get('username', ''))
 
 @app.route('/stats/logout', methods=['POST', 'GET'])
 def stats_logout():
     session.clear()
     return redirect(url_for('stats_login'))
 
+# -------------------- İstek zamanlaması (Server-Timing) --------------------
+# Her istek için toplam süre ve alt aralıklar (db, holiday, upstream, json)
+# ölçülür; `Server-Timing` başlığı olarak gönderilir (tarayıcı devtools →
+# Timing sekmesi) ve rota/aralık başına bellekte histogramlarda toplanır.
+# İstek dışında (arka plan thread'leri) ölçülen aralıklar yalnız histograma gider.
+TIMING_ENABLED = os.getenv("TIMING_ENABLED", "1") == "1"
+# Kova üst sınırları (ms); son kova +Inf
+TIMING_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class _LatencyHistogram:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # anahtar → [kova sayıları..., count, sum_ms, max_ms]
+
+    def observe(self, key: str, ms: float):
+        i = bisect.bisect_left(TIMING_BUCKETS_MS, ms)
+        n = len(TIMING_BUCKETS_MS) + 1
+        with self._lock:
+            row = self._series.get(key)
+            if row is None:
+                row = self._series[key] = [0] * n + [0, 0.0, 0.0]
+            row[i] += 1
+            row[n] += 1
+            row[n + 1] += ms
+            if ms > row[n + 2]:
+                row[n + 2] = ms
+
+    def snapshot(self) -> dict:
+        n = len(TIMING_BUCKETS_MS) + 1
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        out = {}
+        for key, row in sorted(series.items()):
+            count = row[n]
+
+            def quantile(q):
+                # Kova üst sınırı: kümülatif sayı q*count'u geçtiği ilk kova
+                seen = 0
+                for bound, c in zip(TIMING_BUCKETS_MS + (None,), row[:n]):
+                    seen += c
+                    if count and seen >= q * count:
+                        return bound if bound is not None else round(row[n + 2], 2)
+                return None
+
+            out[key] = {
+                'count': count,
+                'avg_ms': round(row[n + 1] / count, 3) if count else 0,
+                'max_ms': round(row[n + 2], 3),
+                'p50_ms': quantile(0.5),
+                'p95_ms': quantile(0.95),
+                'p99_ms': quantile(0.99),
+                'buckets': {('+Inf' if b is None else str(b)): c
+                            for b, c in zip(TIMING_BUCKETS_MS + (None,), row[:n])},
+            }
+        return out
+
+_route_latency = _LatencyHistogram()
+_span_latency = _LatencyHistogram()
+
+def record_span(name: str, seconds: float):
+    """Alt aralık süresini isteğe (Server-Timing) ve toplam histograma ekle."""
+    if not TIMING_ENABLED:
+        return
+    ms = seconds * 1000.0
+    if has_request_context():
+        spans = g.get('_timing_spans')
+        if spans is not None:
+            spans[name] = spans.get(name, 0.0) + ms
+    _span_latency.observe(name, ms)
+
+class timed:
+    """`with timed('holiday'):` bloğunu bir alt aralık olarak ölçer."""
+    __slots__ = ('name', '_t0')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_span(self.name, time.perf_counter() - self._t0)
+
+class _TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with timed('json'):
+            return super().dumps(obj, **kwargs)
+
+app.json = _TimedJSONProvider(app)
+
+@app.before_request
+def _start_request_timer():
+    if TIMING_ENABLED or METRICS_ENABLED:
+        g._timing_t0 = time.perf_counter()
+    if TIMING_ENABLED:
+        g._timing_spans = {}
+
+@app.after_request
+def _finish_request_timer(resp):
+    t0 = g.get('_timing_t0')
+    if t0 is None:
+        return resp
+    total_ms = (time.perf_counter() - t0) * 1000.0
+    rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+    if TIMING_ENABLED:
+        spans = g.get('_timing_spans') or {}
+        parts = [f"{name};dur={ms:.2f}" for name, ms in spans.items()]
+        # Akış yanıtlarında (SSE, export) total yalnızca ilk bayta kadardır
+        parts.append(f"total;dur={total_ms:.2f}")
+        resp.headers['Server-Timing'] = ", ".join(parts)
+        _route_latency.observe(f"{request.method} {rule}", total_ms)
+    if METRICS_ENABLED:
+        inc_metric('http_requests_total', route=rule, method=request.method, status=str(resp.status_code))
+        observe_metric('http_request_duration_seconds', total_ms / 1000.0, route=rule, method=request.method)
+    return resp
+
+def timing_snapshot() -> dict:
+    return {
+        'pid': os.getpid(),
+        'buckets_ms': list(TIMING_BUCKETS_MS),
+        'routes': _route_latency.snapshot(),
+        'spans': _span_latency.snapshot(),
+    }
+
 # -------------------- DB Yolu --------------------
 # Ortam değişkeni öncelikli. Yoksa Render/Heroku gibi ortamlarda kalıcı disk
 # varsa (/var/data) onu kullan; yoksa /tmp’ye düş.
@@ -162,8 +292,227 @@ print("🗄️ Using SQLite path:", DB_PATH)
 # Tatil cache TTL (saniye): cache tazeyse dış API'ye çıkma
 HOLIDAY_CACHE_TTL_SECONDS = int(os.getenv("HOLIDAY_CACHE_TTL_SECONDS", "86400"))
 
+# -------------------- Metrikler (Prometheus /metrics) --------------------
+# Gunicorn'da her worker ayrı bir process: sayaçlar process belleğinde kalırsa
+# /metrics'i hangi worker cevaplarsa yalnız kendi payını gösterir. Bu yüzden her
+# process METRICS_DIR altında kendi mmap dosyasına (metrics_<pid>.bin) yazar;
+# /metrics tüm dosyaları okuyup toplar. Ölen worker'ın dosyası silinmez (sayaçlar
+# geriye gitmesin); dizin gunicorn master başlarken temizlenir (reset_metrics).
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_DIR = Path(os.getenv("METRICS_DIR") or (DATA_DIR / "metrics"))
+# Ayarlıysa /metrics yalnızca `Authorization: Bearer <token>` ya da ?token= ile açılır
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_PREFIX = "prufungskalender_"
+METRICS_FILE_INITIAL_BYTES = 64 * 1024
+# İstek süresi kovaları (saniye): Server-Timing histogramıyla aynı sınırlar
+METRICS_LATENCY_BUCKETS = tuple(ms / 1000.0 for ms in TIMING_BUCKETS_MS)
+
+# aile adı → (tip, açıklama)
+METRIC_FAMILIES = {
+    'http_requests_total': ('counter', "HTTP istekleri (rota, metot, durum kodu)"),
+    'http_request_duration_seconds': ('histogram', "İstek süresi, yanıt başlıklarına kadar (saniye)"),
+    'holiday_cache_total': ('counter', "Tatil verisinin geldiği yer: fresh, stale, fallback, backup, miss"),
+    'holiday_index_total': ('counter', "İşlem içi tatil indeksi: hit, rebuild"),
+    'holiday_fetch_total': ('counter', "Upstream tatil çekimleri: ok, empty, error"),
+    'sqlite_locked_errors_total': ('counter', "busy_timeout dolduktan sonra yüzeye çıkan kilit hataları"),
+    'db_queries_total': ('counter', "Sorgu çalıştırma sayısı"),
+    'db_rows_returned_total': ('counter', "Sorguların döndürdüğü satır sayısı"),
+}
+
+# Dosya düzeni: [uint64 kullanılan bayt] + kayıtlar. Kayıt: [uint32 anahtar uzunluğu]
+# [utf-8 anahtar, 8'e hizalı] [float64 değer]. Yeni kayıt önce yazılır, başlık en son
+# güncellenir; okuyucu yarım kayıt görmez. 8 bayt hizalı double yazımı yırtılmaz.
+_METRICS_HEADER = struct.Struct('Q')
+_METRICS_KEYLEN = struct.Struct('I')
+_METRICS_VALUE = struct.Struct('d')
+
+def _metrics_entry_size(key_bytes: bytes) -> int:
+    head = _METRICS_KEYLEN.size + len(key_bytes)
+    return head + (-head % 8) + _METRICS_VALUE.size
+
+def _iter_metrics_entries(buf, used: int):
+    """(anahtar, değer ofseti) çiftlerini sırayla üretir."""
+    pos = _METRICS_HEADER.size
+    while pos + _METRICS_KEYLEN.size <= used:
+        (n,) = _METRICS_KEYLEN.unpack_from(buf, pos)
+        key = bytes(buf[pos + _METRICS_KEYLEN.size:pos + _METRICS_KEYLEN.size + n]).decode('utf-8')
+        size = _metrics_entry_size(b'\0' * n)
+        yield key, pos + size - _METRICS_VALUE.size
+        pos += size
+
+class _MmapCounterFile:
+    """Process başına sayaç dosyası; yalnızca sahibi olan process yazar."""
+
+    def __init__(self, path: Path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < METRICS_FILE_INITIAL_BYTES:
+            self._file.truncate(METRICS_FILE_INITIAL_BYTES)
+            size = METRICS_FILE_INITIAL_BYTES
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        (self._used,) = _METRICS_HEADER.unpack_from(self._mm, 0)
+        if self._used < _METRICS_HEADER.size:
+            self._used = _METRICS_HEADER.size
+            _METRICS_HEADER.pack_into(self._mm, 0, self._used)
+        # Aynı pid ile yeniden açılan dosyada mevcut kayıtlar kaldığı yerden sürer
+        self._offsets = dict(_iter_metrics_entries(self._mm, self._used))
+
+    def _append(self, key: str) -> int:
+        key_bytes = key.encode('utf-8')
+        size = _metrics_entry_size(key_bytes)
+        if self._used + size > len(self._mm):
+            new_size = max(len(self._mm) * 2, self._used + size)
+            self._mm.close()
+            self._file.truncate(new_size)
+            self._mm = mmap.mmap(self._file.fileno(), new_size)
+        pos = self._used
+        _METRICS_KEYLEN.pack_into(self._mm, pos, len(key_bytes))
+        self._mm[pos + _METRICS_KEYLEN.size:pos + _METRICS_KEYLEN.size + len(key_bytes)] = key_bytes
+        offset = pos + size - _METRICS_VALUE.size
+        _METRICS_VALUE.pack_into(self._mm, offset, 0.0)
+        self._used += size
+        _METRICS_HEADER.pack_into(self._mm, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+    def inc(self, key: str, amount: float):
+        with self._lock:
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._append(key)
+            (value,) = _METRICS_VALUE.unpack_from(self._mm, offset)
+            _METRICS_VALUE.pack_into(self._mm, offset, value + amount)
+
+_metrics_file = None
+_metrics_pid = None
+_metrics_init_lock = threading.Lock()
+_metric_keys = {}  # (ad, etiketler) → dosyadaki anahtar
+
+def _get_metrics_file():
+    global _metrics_file, _metrics_pid
+    if _metrics_file is None or _metrics_pid != os.getpid():
+        with _metrics_init_lock:
+            if _metrics_file is None or _metrics_pid != os.getpid():
+                METRICS_DIR.mkdir(parents=True, exist_ok=True)
+                _metrics_file = _MmapCounterFile(METRICS_DIR / f"metrics_{os.getpid()}.bin")
+                _metrics_pid = os.getpid()
+    return _metrics_file
+
+def inc_metric(name: str, amount: float = 1.0, **labels):
+    """Sayaç artır; örn. inc_metric('holiday_cache_total', source='ferien', result='stale')."""
+    if not METRICS_ENABLED:
+        return
+    label_items = tuple(sorted(labels.items()))
+    key = _metric_keys.get((name, label_items))
+    if key is None:
+        key = _metric_keys[(name, label_items)] = json.dumps([name, label_items], separators=(',', ':'))
+    try:
+        _get_metrics_file().inc(key, amount)
+    except (OSError, ValueError) as e:
+        print(f"Metrik yazılamadı ({name}): {e}")
+
+def observe_metric(name: str, value: float, **labels):
+    """Histogram gözlemi: kovalar dosyada kümülatif olmayan sayılar olarak tutulur."""
+    i = bisect.bisect_left(METRICS_LATENCY_BUCKETS, value)
+    le = repr(METRICS_LATENCY_BUCKETS[i]) if i < len(METRICS_LATENCY_BUCKETS) else '+Inf'
+    inc_metric(name + '_bucket', le=le, **labels)
+    inc_metric(name + '_sum', value, **labels)
+    inc_metric(name + '_count', **labels)
+
+def count_rows(query: str, rows: int):
+    """Adlandırılmış bir sorgunun çalıştığını ve döndürdüğü satır sayısını kaydet."""
+    inc_metric('db_queries_total', query=query)
+    if rows:
+        inc_metric('db_rows_returned_total', rows, query=query)
+
+def count_sqlite_error(exc):
+    if isinstance(exc, sqlite3.OperationalError):
+        msg = str(exc).lower()
+        if 'locked' in msg or 'busy' in msg:
+            inc_metric('sqlite_locked_errors_total')
+
+def reset_metrics():
+    """Eski çalıştırmaların dosyalarını sil; worker'lar fork edilmeden önce çağrılır."""
+    try:
+        for p in METRICS_DIR.glob("metrics_*.bin"):
+            p.unlink()
+    except OSError as e:
+        print(f"Metrik dizini temizlenemedi: {e}")
+
+def read_metrics() -> dict:
+    """Tüm process dosyalarındaki değerleri anahtar başına topla."""
+    totals = {}
+    for p in sorted(METRICS_DIR.glob("metrics_*.bin")):
+        try:
+            buf = p.read_bytes()
+        except OSError:
+            continue
+        if len(buf) < _METRICS_HEADER.size:
+            continue
+        (used,) = _METRICS_HEADER.unpack_from(buf, 0)
+        for key, offset in _iter_metrics_entries(buf, min(used, len(buf))):
+            (value,) = _METRICS_VALUE.unpack_from(buf, offset)
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+def _metric_labels(label_items) -> str:
+    if not label_items:
+        return ''
+    parts = []
+    for k, v in label_items:
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{k}="{v}"')
+    return '{' + ','.join(parts) + '}'
+
+def _metric_value(v: float) -> str:
+    return str(int(v)) if v == int(v) else repr(v)
+
+def render_metrics() -> str:
+    """Prometheus text exposition (0.0.4) biçiminde tüm aileler."""
+    samples = {}  # aile → {etiketler: {örnek adı: değer}}
+    for key, value in read_metrics().items():
+        name, label_items = json.loads(key)
+        family, suffix = name, ''
+        if family not in METRIC_FAMILIES:
+            family, _, suffix = name.rpartition('_')
+            suffix = '_' + suffix
+        if family not in METRIC_FAMILIES:
+            continue
+        labels = tuple(tuple(kv) for kv in label_items)
+        le = None
+        if suffix == '_bucket':
+            le = dict(labels).get('le')
+            labels = tuple(kv for kv in labels if kv[0] != 'le')
+        series = samples.setdefault(family, {}).setdefault(labels, {})
+        series[(suffix, le)] = series.get((suffix, le), 0.0) + value
+
+    lines = []
+    for family, (kind, help_text) in METRIC_FAMILIES.items():
+        full = METRICS_PREFIX + family
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        for labels, series in sorted(samples.get(family, {}).items()):
+            if kind != 'histogram':
+                lines.append(f"{full}{_metric_labels(labels)} {_metric_value(series[('', None)])}")
+                continue
+            cumulative = 0.0
+            for bound in [repr(b) for b in METRICS_LATENCY_BUCKETS] + ['+Inf']:
+                cumulative += series.get(('_bucket', bound), 0.0)
+                lines.append(f"{full}_bucket{_metric_labels(labels + (('le', bound),))} {_metric_value(cumulative)}")
+            lines.append(f"{full}_sum{_metric_labels(labels)} {_metric_value(series.get(('_sum', None), 0.0))}")
+            lines.append(f"{full}_count{_metric_labels(labels)} {_metric_value(series.get(('_count', None), 0.0))}")
+    return "\n".join(lines) + "\n"
+
 # -------------------- Bağlantı --------------------
-def get_db_connection():
+# Worker başına bağlantı havuzu: PRAGMA'lar yalnızca bağlantı açılırken bir kez
+# çalışır. En fazla SQLITE_POOL_SIZE boşta bağlantı tutulur; daha fazla eşzamanlı
+# istek olursa (gthread) fazlası açılıp iade edilince kapatılır, kimse beklemez.
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+# Bu kadar saniye boşta kalan bağlantı tekrar verilmeden önce SELECT 1 ile denenir
+SQLITE_POOL_HEALTHCHECK_SECONDS = int(os.getenv("SQLITE_POOL_HEALTHCHECK_SECONDS", "30"))
+
+def _open_db_connection():
     # SQLite + gunicorn için güvenli ayarlar
     conn = sqlite3.connect(DB_PATH, timeout=10, check_same_thread=False)
     conn.row_factory = sqlite3.Row
@@ -173,6 +522,122 @@ def get_db_connection():
     conn.execute("PRAGMA foreign_keys=ON;")
     return conn
 
+class _SQLitePool:
+    def __init__(self, size: int):
+        self.size = max(0, size)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # fork sonrası ebeveynden kalan bağlantılar paylaşılmaz, sadece bırakılır
+        self._pid = os.getpid()
+        self._idle = []  # (conn, son kullanım zamanı), LIFO
+        self._in_use = 0
+        self._opened = 0
+
+    def _healthy(self, conn, last_used: float) -> bool:
+        if time.monotonic() - last_used < SQLITE_POOL_HEALTHCHECK_SECONDS:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+                item = self._idle.pop() if self._idle else None
+                self._in_use += 1
+            if item is None:
+                try:
+                    conn = _open_db_connection()
+                except Exception:
+                    with self._lock:
+                        self._in_use -= 1
+                    raise
+                with self._lock:
+                    self._opened += 1
+                return conn
+            conn, last_used = item
+            if self._healthy(conn, last_used):
+                return conn
+            with self._lock:
+                self._in_use -= 1
+            self._close(conn)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            if len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._close(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._in_use -= 1
+        self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._opened = max(0, self._opened - 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "idle": len(self._idle), "in_use": self._in_use, "open": self._opened}
+
+_db_pool = _SQLitePool(SQLITE_POOL_SIZE)
+
+class _PooledConnection:
+    """`with get_db_connection() as conn:` ile kullanılır; sqlite3 bağlantısının
+    context manager'ı gibi çıkışta commit/rollback yapar, ardından havuza iade eder."""
+    __slots__ = ('_conn', '_t0')
+
+    def __init__(self):
+        self._conn = None
+
+    def __enter__(self):
+        # 'db' aralığı: havuzdan alma (bekleme dahil) → iade
+        self._t0 = time.perf_counter()
+        self._conn = _db_pool.acquire()
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        conn, self._conn = self._conn, None
+        if exc is not None:
+            count_sqlite_error(exc)
+        try:
+            if exc_type is None:
+                conn.commit()
+            else:
+                conn.rollback()
+        except sqlite3.OperationalError as e:
+            count_sqlite_error(e)
+            raise
+        finally:
+            _db_pool.release(conn)
+            record_span('db', time.perf_counter() - self._t0)
+        return False
+
+def get_db_connection():
+    return _PooledConnection()
+
 # -------------------- İlk kurulum (1 kez) --------------------
 _init_lock = threading.Lock()
 _init_done = False
@@ -197,87 +662,279 @@ def seed_fallback_if_needed():
     finally:
         _seed_done = True
 
+# -------------------- exam_stats özet tablosu --------------------
+# /stats ve /stats/json exams'i taramak yerine bu özetten okur (gün x sınıf x ders satırı).
+EXAM_STATS_INSERT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_exam_stats_insert AFTER INSERT ON exams BEGIN
+        INSERT INTO exam_stats (date, grade, subject, cnt) VALUES (NEW.date, NEW.grade, NEW.subject, 1)
+        ON CONFLICT (date, grade, subject) DO UPDATE SET cnt = cnt + 1;
+    END
+"""
+EXAM_STATS_DELETE_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_exam_stats_delete AFTER DELETE ON exams BEGIN
+        UPDATE exam_stats SET cnt = cnt - 1
+        WHERE date = OLD.date AND grade = OLD.grade AND subject = OLD.subject;
+        DELETE FROM exam_stats
+        WHERE date = OLD.date AND grade = OLD.grade AND subject = OLD.subject AND cnt <= 0;
+    END
+"""
+EXAM_STATS_UPDATE_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_exam_stats_update AFTER UPDATE OF date, grade, subject ON exams BEGIN
+        UPDATE exam_stats SET cnt = cnt - 1
+        WHERE date = OLD.date AND grade = OLD.grade AND subject = OLD.subject;
+        DELETE FROM exam_stats
+        WHERE date = OLD.date AND grade = OLD.grade AND subject = OLD.subject AND cnt <= 0;
+        INSERT INTO exam_stats (date, grade, subject, cnt) VALUES (NEW.date, NEW.grade, NEW.subject, 1)
+        ON CONFLICT (date, grade, subject) DO UPDATE SET cnt = cnt + 1;
+    END
+"""
+EXAM_STATS_BACKFILL_SQL = """
+    INSERT INTO exam_stats (date, grade, subject, cnt)
+    SELECT date, grade, subject, COUNT(*) FROM exams GROUP BY date, grade, subject
+"""
+
+def verify_exam_stats(conn) -> list:
+    """exam_stats ile exams'ten sayılan değerleri karşılaştır; farklı (date, grade, subject, özet, gerçek) satırları döndür."""
+    rows = conn.execute("""
+        SELECT date, grade, subject, SUM(s) AS stored, SUM(e) AS actual FROM (
+            SELECT date, grade, subject, cnt AS s, 0 AS e FROM exam_stats
+            UNION ALL
+            SELECT date, grade, subject, 0, COUNT(*) FROM exams GROUP BY date, grade, subject
+        )
+        GROUP BY date, grade, subject
+        HAVING stored != actual
+    """).fetchall()
+    return [tuple(r) for r in rows]
+
+def rebuild_exam_stats(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM exam_stats")
+        conn.execute(EXAM_STATS_BACKFILL_SQL)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+@app.cli.command('rebuild-exam-stats')
+@click.option('--force', is_flag=True, help="Fark olmasa da yeniden kur.")
+def rebuild_exam_stats_command(force):
+    """exam_stats özetini exams tablosuyla doğrula; fark varsa yeniden kur."""
+    init_db()
+    with get_db_connection() as conn:
+        mismatches = verify_exam_stats(conn)
+        for date_str, grade, subject, stored, actual in mismatches[:20]:
+            print(f"≠ {date_str} {grade} {subject}: özet={stored} gerçek={actual}")
+        if not mismatches and not force:
+            print("✅ exam_stats exams ile tutarlı")
+            return
+        rebuild_exam_stats(conn)
+        remaining = verify_exam_stats(conn)
+    if remaining:
+        print(f"❌ Yeniden kurulumdan sonra hâlâ {len(remaining)} fark var")
+        raise SystemExit(1)
+    print(f"✅ exam_stats yeniden kuruldu ({len(mismatches)} fark giderildi)")
+
+# -------------------- Veri sürümü (data_version) --------------------
+# Kapsam başına artan sayaç: 'calendar' (exams + obst_schedule) ve 'subjects'.
+# Trigger'lar her yazımda artırır, bu yüzden hangi rota/worker/araç yazarsa
+# yazsın tüm process'ler aynı sürümü görür. ETag'ler ve yanıt cache'leri bu
+# sürüme bağlanır; istemciler /api/version veya X-Data-Version ile kontrol eder.
+DATA_VERSION_SCOPES = {
+    'calendar': ('exams', 'obst_schedule'),
+    'subjects': ('subjects',),
+}
+
+def _data_version_triggers():
+    for scope, tables in DATA_VERSION_SCOPES.items():
+        for table in tables:
+            for op in ('INSERT', 'UPDATE', 'DELETE'):
+                yield f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_dv_{table}_{op.lower()} AFTER {op} ON {table} BEGIN
+                        UPDATE data_version
+                        SET version = version + 1, updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+                        WHERE scope = '{scope}';
+                    END
+                """
+
+DATA_VERSION_SQL = "SELECT scope, version FROM data_version"
+
+def read_data_versions(conn) -> dict:
+    return {scope: version for scope, version in conn.execute(DATA_VERSION_SQL)}
+
+def get_data_versions() -> dict:
+    """{'calendar': n, 'subjects': m}; istek başına bir kez okunur (flask.g) ve yanıt başlığına yazılır."""
+    if has_request_context() and 'data_versions' in g:
+        return g.data_versions
+    with get_db_connection() as conn:
+        versions = read_data_versions(conn)
+    if has_request_context():
+        g.data_versions = versions
+    return versions
+
+def data_version(scope: str = 'calendar') -> int:
+    return get_data_versions().get(scope, 0)
+
+# -------------------- Şema migration'ları --------------------
+# Şema değişiklikleri numaralı adımlar olarak eklenir (yalnızca sona ekle, eskisini
+# değiştirme). Uygulanan son adım `PRAGMA user_version`'da tutulur; güncel bir DB'de
+# açılış maliyeti bu tek okumadır. Bekleyen adımlar tek transaction'da çalışır.
+
+def _migration_1_baseline(conn):
+    """user_version öncesi şema (CREATE IF NOT EXISTS ile mevcut DB'lere de uyar)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS exams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject     TEXT NOT NULL,
+            grade       TEXT NOT NULL DEFAULT '4A',
+            date        TEXT NOT NULL,
+            start_time  TEXT NOT NULL DEFAULT '08:00',
+            end_time    TEXT NOT NULL DEFAULT '16:00',
+            created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Sorguların hızlanması için tarih alanına indeks
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_exams_date ON exams(date)")
+    # Ders havuzu tablosu (stats sayfasından yönetilecek)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS admin_credentials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Obst (meyve günü) planlama tablosu: her tarih için 1 veli
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS obst_schedule (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            parent_name TEXT NOT NULL,
+            delete_token TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(date)
+        )
+    """)
+    # delete_token sütunu sonradan eklendi: eski DB'lerde yoksa ekle
+    col_names = {c[1] for c in conn.execute("PRAGMA table_info(obst_schedule)").fetchall()}
+    if 'delete_token' not in col_names:
+        conn.execute("ALTER TABLE obst_schedule ADD COLUMN delete_token TEXT")
+    # Artık kullanılmayan tablolar
+    conn.execute("DROP TABLE IF EXISTS visits")
+    conn.execute("DROP TABLE IF EXISTS email_schedule")
+
+def _migration_2_exams_date_id_index(conn):
+    """index() `ORDER BY date, id` sıralamasını doğrudan indeksten okusun."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_exams_date_id ON exams(date, id)")
+    # (date, id) indeksi tek sütunlu tarih indeksini tamamen kapsar
+    conn.execute("DROP INDEX IF EXISTS idx_exams_date")
+
+def _migration_3_covering_indexes(conn):
+    """Sıcak sorguların tamamı (index, /events, /delete, stats, Obst) tablo okumadan indeksten cevaplansın.
+
+    `id` açıkça ikinci sütun: `ORDER BY date, id` sırası korunur, diğer sütunlar kapsama içindir.
+    """
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_exams_date_cover "
+        "ON exams(date, id, grade, subject, start_time, end_time)"
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_exams_date_id")
+    # UNIQUE(date) indeksi parent_name'i içermez; /events ve Obst listeleri için kapsayan indeks
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_obst_schedule_date_cover ON obst_schedule(date, parent_name)")
+
+def _migration_4_exam_stats(conn):
+    """Gün/sınıf/ders başına sınav sayısı: exams üzerindeki trigger'larla güncel tutulur."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS exam_stats (
+            date    TEXT NOT NULL,
+            grade   TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            cnt     INTEGER NOT NULL,
+            PRIMARY KEY (date, grade, subject)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(EXAM_STATS_INSERT_TRIGGER)
+    conn.execute(EXAM_STATS_DELETE_TRIGGER)
+    conn.execute(EXAM_STATS_UPDATE_TRIGGER)
+    conn.execute("DELETE FROM exam_stats")
+    conn.execute(EXAM_STATS_BACKFILL_SQL)
+
+def _migration_5_data_version(conn):
+    """Kapsam başına veri sürümü tablosu + exams/obst_schedule/subjects trigger'ları."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            scope      TEXT PRIMARY KEY,
+            version    INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.executemany(
+        "INSERT OR IGNORE INTO data_version (scope, version, updated_at) "
+        "VALUES (?, 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))",
+        [(scope,) for scope in DATA_VERSION_SCOPES],
+    )
+    for trigger_sql in _data_version_triggers():
+        conn.execute(trigger_sql)
+
+MIGRATIONS = [
+    (1, "baseline", _migration_1_baseline),
+    (2, "exams_date_id_index", _migration_2_exams_date_id_index),
+    (3, "covering_indexes", _migration_3_covering_indexes),
+    (4, "exam_stats", _migration_4_exam_stats),
+    (5, "data_version", _migration_5_data_version),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate_db(conn) -> int:
+    """Bekleyen migration'ları uygula; DB'nin şema sürümünü döndür."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current >= SCHEMA_VERSION:
+        return current
+    # IMMEDIATE: aynı anda açılan başka bir process yazma kilidini bekler
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, name, step in MIGRATIONS:
+            if version > current:
+                step(conn)
+                print(f"🛠️ Migration {version} ({name}) uygulandı")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return SCHEMA_VERSION
+
 def init_db():
-    """Tabloları güvenli şekilde bir kere oluştur."""
+    """Şemayı migrate et ve veri dizinlerini bir kere hazırla."""
     global _init_done
     if _init_done:
         return
     with _init_lock:
         if _init_done:
             return
-        with get_db_connection() as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS exams (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    subject     TEXT NOT NULL,
-                    grade       TEXT NOT NULL DEFAULT '4A',
-                    date        TEXT NOT NULL,
-                    start_time  TEXT NOT NULL DEFAULT '08:00',
-                    end_time    TEXT NOT NULL DEFAULT '16:00',
-                    created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            # Sorguların hızlanması için tarih alanına indeks
-            try:
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_exams_date ON exams(date)")
-            except Exception:
-                pass
-            # Ders havuzu tablosu (stats sayfasından yönetilecek)
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS subjects (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            )
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS admin_credentials (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            # Obst (meyve günü) planlama tablosu: her tarih için 1 veli
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS obst_schedule (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT NOT NULL,
-                    parent_name TEXT NOT NULL,
-                    delete_token TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(date)
-                )
-                """
-            )
-
-            # Migration: delete_token sütunu (idempotent)
-            try:
-                cols = conn.execute("PRAGMA table_info(obst_schedule)").fetchall()
-                col_names = {c['name'] for c in cols} if cols else set()
-                if 'delete_token' not in col_names:
-                    conn.execute("ALTER TABLE obst_schedule ADD COLUMN delete_token TEXT")
-            except Exception:
-                pass
-
-            # Artık kullanılmayan tabloları kaldır (idempotent)
-            try:
-                conn.execute("DROP TABLE IF EXISTS visits")
-                conn.execute("DROP TABLE IF EXISTS email_schedule")
-            except Exception:
-                pass
-            # Admin kaydı yoksa seed
-            existing_admin = conn.execute("SELECT id FROM admin_credentials LIMIT 1").fetchone()
-            if not existing_admin:
-                default_user = 'Ahmet'
-                default_pass = '45ee551'
-                pwd_hash = generate_password_hash(default_pass, method='pbkdf2:sha256', salt_length=16)
-                conn.execute("INSERT INTO admin_credentials (username, password_hash) VALUES (?, ?)", (default_user, pwd_hash))
-            
-            conn.commit()
+        # Havuz yerine tek seferlik bağlantı: init_db gunicorn master'ında çalışır ve
+        # havuzda kalan bağlantı fork ile worker'lara taşınırdı (SQLite bunu desteklemez)
+        conn = _open_db_connection()
+        try:
+            with conn:
+                migrate_db(conn)
+                # Admin kaydı yoksa seed
+                existing_admin = conn.execute("SELECT id FROM admin_credentials LIMIT 1").fetchone()
+                if not existing_admin:
+                    default_user = 'Ahmet'
+                    default_pass = '45ee551'
+                    pwd_hash = generate_password_hash(default_pass, method='pbkdf2:sha256', salt_length=16)
+                    conn.execute("INSERT INTO admin_credentials (username, password_hash) VALUES (?, ?)", (default_user, pwd_hash))
+        finally:
+            conn.close()
         # Veri dizinlerini ve seed fallback'leri hazırla
         try:
             CACHE_DIR.mkdir(parents=True, exist_ok=True)
@@ -289,11 +946,718 @@ def init_db():
         _init_done = True
         print(f"✅ SQLite initialized at {DB_PATH}")
 
-# Flask 3.x: before_first_request yerine before_request ile garanti
-@app.before_request
-def ensure_inited():
+# -------------------- Başlangıç (trafikten önce 1 kez) --------------------
+# Şema, dizinler ve seed istek yolunda değil, worker'lar trafiğe açılmadan önce
+# çalışır: gunicorn.conf.py (on_starting / post_fork), `flask --app app db-init`
+# ya da `python app.py`.
+def start_background_workers():
+    """Worker (process) başına arka plan thread'leri; fork'tan sonra çağrılmalı."""
+    start_holiday_refresher()
+
+def init_app():
+    init_db()
+    start_background_workers()
+
+@app.cli.command('db-init')
+def db_init_command():
+    """Tabloları oluştur, veri dizinlerini ve seed fallback'leri hazırla."""
+    init_db()
+
+
+# -------------------- Tatil indeksi (worker başına 1 kez) --------------------
+# /events her istekte cache JSON'larını diskten okuyup hafta içi aralıklara
+# açmasın diye yıl bazında işlem içi bir indeks tutulur. Kayıt, kaynak
+# dosyaların mtime'ı değişince ya da süresi dolunca yeniden kurulur.
+
+# Ağ/cache/fallback başarısız olursa yeniden denemeden önce beklenecek süre (saniye)
+HOLIDAY_INDEX_RETRY_SECONDS = int(os.getenv("HOLIDAY_INDEX_RETRY_SECONDS", "300"))
+
+# Bayern ferien-api.de'den veri gelmezse kullanılacak yedek tatiller ('end' inclusive)
+BACKUP_FERIEN = [
+    {"start": "2025-03-03", "end": "2025-03-08"},
+    {"start": "2025-04-14", "end": "2025-04-26"},
+    {"start": "2025-06-10", "end": "2025-06-21"},
+    {"start": "2025-08-01", "end": "2025-09-16"},
+    {"start": "2025-11-03", "end": "2025-11-08"},  # Herbstferien 3-7 Kasım (7 dahil)
+    {"start": "2025-11-19", "end": "2025-11-19"},  # Buß- und Bettag (schulfrei)
+    {"start": "2025-12-22", "end": "2026-01-06"},
+]
+
+_holiday_index = {}
+_holiday_index_lock = threading.Lock()
+# İndeks kaydı her değiştiğinde artar; türetilmiş yanıt cache'leri bununla anahtarlanır
+_holiday_generation = 0
+_holiday_generation_lock = threading.Lock()
+_backup_ferien_events = None
+
+def _cache_is_fresh(p: Path) -> bool:
+    try:
+        if not p.exists():
+            return False
+        age = time.time() - p.stat().st_mtime
+        return age <= HOLIDAY_CACHE_TTL_SECONDS
+    except Exception:
+        return False
+
+def _read_json_file(p: Path):
+    try:
+        return json.loads(p.read_text(encoding='utf-8'))
+    except Exception:
+        return None
+
+def _file_mtime(p: Path):
+    try:
+        return p.stat().st_mtime
+    except OSError:
+        return None
+
+def _holiday_source_files(y: int):
+    return (CACHE_DIR / f"BY_{y}.json", FALLBACK_DIR / f"BY_{y}.json", FEIERTAGE_CACHE_DIR / f"DE_{y}.json")
+
+def _background_event(start_str: str, end_str: str) -> dict:
+    return {
+        'start': start_str,
+        'end': end_str,
+        'rendering': 'background',
+        'backgroundColor': '#f0f0f0',
+        'display': 'background'
+    }
+
+# -- Takvim aritmetiği: tarihler proleptik Gregoryen ordinal (date.toordinal) olarak tutulur.
+# Ordinal 1 (0001-01-01) Pazartesi olduğundan hafta günü = (ordinal - 1) % 7 (0=Mon .. 6=Sun).
+
+def _date_ordinal(date_str: str) -> int:
+    return date.fromisoformat(date_str).toordinal()
+
+@lru_cache(maxsize=4096)
+def _ordinal_iso(o: int) -> str:
+    return date.fromordinal(o).isoformat()
+
+def _weekday_runs(spans):
+    """[başlangıç, bitiş) ordinal aralıklarını hafta içi bloklara böl (hafta sonları hariç).
+
+    Gün gün yürümek yerine her hafta kapalı formda hesaplanır: bir blok ya aralığın
+    başından ya da Pazartesi'den başlar, Cumartesi'de ya da aralık sonunda biter.
+    Tüm aralıklar için tekrarsız ve sıralı (başlangıç, bitiş) ordinal çiftleri döner.
+    """
+    runs = set()
+    for s, e in spans:
+        monday = s - (s - 1) % 7
+        if s >= monday + 5:  # Cumartesi/Pazar ile başlıyorsa sonraki Pazartesi'ye atla
+            monday += 7
+            s = monday
+        while s < e:
+            run_end = min(e, monday + 5)
+            runs.add((s, run_end))
+            monday += 7
+            s = monday
+    return sorted(runs)
+
+def _weekday_ranges(start_str: str, end_exclusive_str: str):
+    """YYYY-MM-DD aralığını hafta içi bloklara böl; (başlangıç, exclusive bitiş) string çiftleri döner."""
+    try:
+        span = (_date_ordinal(start_str), _date_ordinal(end_exclusive_str))
+    except Exception:
+        return []
+    return [(_ordinal_iso(s), _ordinal_iso(e)) for s, e in _weekday_runs([span])]
+
+def _background_events_for_runs(runs):
+    return [_background_event(_ordinal_iso(s), _ordinal_iso(e)) for s, e in runs]
+
+def _load_ferien_year(y: int):
+    """Bayern Ferien: cache (taze ya da eski) > yıllık lokal fallback. Ağa çıkmaz."""
+    cache_file, fb_file, _ = _holiday_source_files(y)
+    # Cache yoksa/eskidiyse arka plan yenileyiciye haber ver, istek beklemez
+    fresh = _cache_is_fresh(cache_file)
+    if not fresh:
+        schedule_holiday_refresh(y)
+    ferien = _read_json_file(cache_file) if cache_file.exists() else None
+    result = 'fresh' if fresh else 'stale'
+
+    # Eğer cache boşsa veya hiç veri yoksa, yıllık lokal fallback'i dene
+    if not ferien or (isinstance(ferien, list) and len(ferien) == 0):
+        result = 'miss'
+        if fb_file.exists():
+            ferien = _read_json_file(fb_file)
+            if ferien:
+                result = 'fallback'
+                print(f"ℹ️ Fallback ferien kullanıldı: {fb_file}")
+    inc_metric('holiday_cache_total', source='ferien', result=result)
+    return ferien if isinstance(ferien, list) and ferien else None
+
+def _load_feiertage_year(y: int):
+    """Resmî tatiller (date.nager.at): cache (taze ya da eski). Ağa çıkmaz."""
+    _, _, cache_file = _holiday_source_files(y)
+    fresh = _cache_is_fresh(cache_file)
+    if not fresh:
+        schedule_holiday_refresh(y)
+    feiertage = _read_json_file(cache_file) if cache_file.exists() else None
+    ok = isinstance(feiertage, list) and feiertage
+    inc_metric('holiday_cache_total', source='feiertage',
+               result=('fresh' if fresh else 'stale') if ok else 'miss')
+    return feiertage if ok else None
+
+def _build_holiday_year(y: int) -> dict:
+    """Bir yılın Ferien + Feiertage arka plan etkinliklerini (hafta içi) hazırla."""
+    spans = []
+    for holiday in _load_ferien_year(y) or []:
+        try:
+            start = holiday.get('start')
+            end = holiday.get('end')
+            if start and end:
+                # 'end' inclusive: +1 günle exclusive'e çevir
+                spans.append((_date_ordinal(start), _date_ordinal(end) + 1))
+        except Exception:
+            continue
+    runs = set(_weekday_runs(spans))
+    ferien_count = len(runs)
+
+    for ft in _load_feiertage_year(y) or []:
+        try:
+            # Yalnızca Bavyera için geçerli olan veya ülke çapında (global) olan tatilleri al
+            is_global = bool(ft.get('global'))
+            counties = ft.get('counties') or []
+            if not (is_global or 'DE-BY' in counties):
+                continue
+            date_str = ft.get('date')  # YYYY-MM-DD
+            if not date_str:
+                continue
+            o = _date_ordinal(date_str)
+            # Hafta sonu ise atla (yalnızca hafta içi önemli); tek günlük exclusive aralık
+            if (o - 1) % 7 < 5:
+                runs.add((o, o + 1))
+        except Exception:
+            continue
+
+    ferien_cache, _, feiertage_cache = _holiday_source_files(y)
+    mtimes = tuple(_file_mtime(p) for p in _holiday_source_files(y))
+    now = time.time()
+    # Her iki kaynak da taze cache'ten geldiyse cache süresi dolana kadar geçerli;
+    # aksi halde (ağ hatası, fallback) kısa süre sonra yeniden dene
+    if _cache_is_fresh(ferien_cache) and _cache_is_fresh(feiertage_cache):
+        expires_at = min(mtimes[0], mtimes[2]) + HOLIDAY_CACHE_TTL_SECONDS
+    else:
+        expires_at = now + HOLIDAY_INDEX_RETRY_SECONDS
+    return {
+        'year': y,
+        'events': _background_events_for_runs(sorted(runs)),
+        'ferien_count': ferien_count,
+        'mtimes': mtimes,
+        'built_at': now,
+        'expires_at': expires_at,
+    }
+
+def _holiday_entry_valid(entry, y: int) -> bool:
+    if entry is None or time.time() > entry['expires_at']:
+        return False
+    return entry['mtimes'] == tuple(_file_mtime(p) for p in _holiday_source_files(y))
+
+def _store_holiday_entry(entry: dict) -> dict:
+    global _holiday_generation
+    with _holiday_generation_lock:
+        _holiday_index[entry['year']] = entry
+        _holiday_generation += 1
+    return entry
+
+def get_holiday_year(y: int) -> dict:
+    entry = _holiday_index.get(y)
+    if _holiday_entry_valid(entry, y):
+        inc_metric('holiday_index_total', result='hit')
+        return entry
+    with _holiday_index_lock:
+        # Kilit beklenirken başka bir thread kurmuş olabilir
+        entry = _holiday_index.get(y)
+        if _holiday_entry_valid(entry, y):
+            inc_metric('holiday_index_total', result='hit')
+            return entry
+        entry = _store_holiday_entry(_build_holiday_year(y))
+        inc_metric('holiday_index_total', result='rebuild')
+        return entry
+
+def _backup_background_events():
+    global _backup_ferien_events
+    if _backup_ferien_events is None:
+        # backup 'end' değerini inclusive kabul edip +1 günle exclusive'e çevir
+        spans = [(_date_ordinal(h['start']), _date_ordinal(h['end']) + 1) for h in BACKUP_FERIEN]
+        _backup_ferien_events = _background_events_for_runs(_weekday_runs(spans))
+    return _backup_ferien_events
+
+def holiday_background_events(years, start_arg: str = '', end_arg: str = ''):
+    """İstenen yılların arka plan etkinliklerinden [start_arg, end_arg) ile kesişenleri döndür."""
+    windowed = bool(start_arg and end_arg)
+    out = []
+    seen = set()
+    ferien_count = 0
+
+    def _take(events):
+        for ev in events:
+            if windowed and (ev['end'] <= start_arg or ev['start'] >= end_arg):
+                continue
+            key = (ev['start'], ev['end'])
+            if key not in seen:
+                seen.add(key)
+                out.append(ev)
+
+    for y in sorted(years):
+        entry = get_holiday_year(y)
+        ferien_count += entry['ferien_count']
+        _take(entry['events'])
+    # Eğer API'dan hiç tatil gelmediyse yedekleri ekle (hafta sonları zaten hariç)
+    if ferien_count == 0:
+        print("Ferien API'dan hiç tatil eklenmedi, yedekler kullanılıyor.")
+        inc_metric('holiday_cache_total', source='ferien', result='backup')
+        _take(_backup_background_events())
+    return out
+
+# -------------------- Tatil yenileyici (arka plan) --------------------
+# İstekler asla ağı beklemez: ferien-api.de ve date.nager.at verileri bu
+# thread tarafından cache süresi dolmadan önce çekilir, cache dosyasına
+# atomik olarak yazılır ve indeks kaydı hazır halde değiştirilir.
+FERIEN_API_BASE = os.getenv("FERIEN_API_BASE", "https://ferien-api.de/api/v1/holidays/BY").rstrip('/')
+FEIERTAGE_API_BASE = os.getenv("FEIERTAGE_API_BASE", "https://date.nager.at/api/v3/PublicHolidays").rstrip('/')
+HOLIDAY_FETCH_TIMEOUT = float(os.getenv("HOLIDAY_FETCH_TIMEOUT", "5"))
+# Cache bu kadar saniye içinde eskiyecekse önceden yenile
+HOLIDAY_REFRESH_AHEAD_SECONDS = int(os.getenv("HOLIDAY_REFRESH_AHEAD_SECONDS", str(HOLIDAY_CACHE_TTL_SECONDS // 4)))
+HOLIDAY_REFRESH_INTERVAL_SECONDS = int(os.getenv("HOLIDAY_REFRESH_INTERVAL_SECONDS", "900"))
+HOLIDAY_REFRESH_ENABLED = os.getenv("HOLIDAY_REFRESH_ENABLED", "1") == "1"
+# Paralel upstream çağrısı sayısı (kaynak x yıl)
+HOLIDAY_FETCH_WORKERS = int(os.getenv("HOLIDAY_FETCH_WORKERS", "4"))
+
+_refresh_wakeup = threading.Event()
+_refresh_years = set()
+_refresh_years_lock = threading.Lock()
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+_fetch_lock = threading.Lock()
+_fetch_init_lock = threading.Lock()
+_inflight_fetches = {}
+_http_session = None
+_http_session_pid = None
+_fetch_executor = None
+_fetch_executor_pid = None
+
+def _holiday_source_url(source: str, y: int) -> str:
+    if source == 'ferien':
+        return f"{FERIEN_API_BASE}/{y}"
+    return f"{FEIERTAGE_API_BASE}/{y}/DE"
+
+def _holiday_cache_file(source: str, y: int) -> Path:
+    ferien_cache, _, feiertage_cache = _holiday_source_files(y)
+    return ferien_cache if source == 'ferien' else feiertage_cache
+
+def _write_text_atomic(p: Path, text: str):
+    """Okuyucular yarım yazılmış dosya görmesin: önce geçici dosya, sonra rename."""
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f".{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_text(text, encoding='utf-8')
+        os.replace(tmp, p)
+    finally:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+def _needs_refresh(p: Path) -> bool:
+    mtime = _file_mtime(p)
+    if mtime is None:
+        return True
+    return time.time() - mtime > HOLIDAY_CACHE_TTL_SECONDS - HOLIDAY_REFRESH_AHEAD_SECONDS
+
+def _get_http_session() -> requests.Session:
+    """Worker başına paylaşılan Session: upstream bağlantıları havuzda tutulur."""
+    global _http_session, _http_session_pid
+    if _http_session is None or _http_session_pid != os.getpid():
+        with _fetch_init_lock:
+            if _http_session is None or _http_session_pid != os.getpid():
+                s = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HOLIDAY_FETCH_WORKERS)
+                s.mount('https://', adapter)
+                s.mount('http://', adapter)
+                _http_session = s
+                _http_session_pid = os.getpid()
+    return _http_session
+
+def _get_fetch_executor() -> ThreadPoolExecutor:
+    global _fetch_executor, _fetch_executor_pid
+    if _fetch_executor is None or _fetch_executor_pid != os.getpid():
+        with _fetch_init_lock:
+            if _fetch_executor is None or _fetch_executor_pid != os.getpid():
+                _fetch_executor = ThreadPoolExecutor(max_workers=HOLIDAY_FETCH_WORKERS, thread_name_prefix="holiday-fetch")
+                _fetch_executor_pid = os.getpid()
+    return _fetch_executor
+
+def fetch_holiday_source(source: str, y: int) -> bool:
+    """Tek bir (kaynak, yıl) çiftini çek; dolu liste gelirse cache'e yaz."""
+    url = _holiday_source_url(source, y)
+    try:
+        with timed('upstream'):
+            resp = _get_http_session().get(url, timeout=HOLIDAY_FETCH_TIMEOUT)
+        if resp.status_code != 200:
+            raise RuntimeError(f"HTTP {resp.status_code}")
+        data = resp.json()
+        # Yalnızca dolu liste döndüyse cache'e yaz (boş [] ise yazma)
+        if isinstance(data, list) and len(data) > 0:
+            _write_text_atomic(_holiday_cache_file(source, y), resp.text)
+            inc_metric('holiday_fetch_total', source=source, result='ok')
+            return True
+        inc_metric('holiday_fetch_total', source=source, result='empty')
+    except Exception as e:
+        print(f"Tatil yenileme hatası {url}: {e}")
+        inc_metric('holiday_fetch_total', source=source, result='error')
+    return False
+
+def _fetch_holiday_source_shared(source: str, y: int) -> Future:
+    """Aynı (kaynak, yıl) için uçuştaki isteği paylaş: eşzamanlı çağıranlar tek upstream çağrısını bekler."""
+    key = (source, y)
+    with _fetch_lock:
+        fut = _inflight_fetches.get(key)
+        if fut is not None:
+            return fut
+        fut = _get_fetch_executor().submit(fetch_holiday_source, source, y)
+        _inflight_fetches[key] = fut
+
+    def _done(_f, key=key):
+        with _fetch_lock:
+            if _inflight_fetches.get(key) is _f:
+                del _inflight_fetches[key]
+    fut.add_done_callback(_done)
+    return fut
+
+def fetch_holiday_sources(pairs) -> dict:
+    """Tüm (kaynak, yıl) çiftlerini paralel çek; {(kaynak, yıl): başarı} döndür."""
+    futures = {key: _fetch_holiday_source_shared(*key) for key in set(pairs)}
+    results = {}
+    for key, fut in futures.items():
+        try:
+            results[key] = fut.result()
+        except Exception:
+            results[key] = False
+    return results
+
+def _default_refresh_years():
+    now_y = datetime.now().year
+    return {now_y, now_y + 1}
+
+def refresh_holidays(years=None, force: bool = False) -> dict:
+    """Eskimek üzere olan kaynakları paralel yenile ve etkilenen yılların indeks kayıtlarını yeniden kur."""
+    if years is None:
+        with _refresh_years_lock:
+            _refresh_years.update(_default_refresh_years())
+            years = set(_refresh_years)
+    # Başka bir worker az önce yenilemiş olabilir: taze olanları atla
+    pairs = [
+        (source, y)
+        for y in years
+        for source in ('ferien', 'feiertage')
+        if force or _needs_refresh(_holiday_cache_file(source, y))
+    ]
+    fetched = fetch_holiday_sources(pairs) if pairs else {}
+    results = {}
+    for y in sorted(years):
+        results[y] = {source: ok for (source, yy), ok in fetched.items() if yy == y}
+        # Başka worker'ın yazdığı cache de (mtime değişimi) burada indekse alınır
+        if any(results[y].values()) or not _holiday_entry_valid(_holiday_index.get(y), y):
+            entry = _build_holiday_year(y)
+            with _holiday_index_lock:
+                _store_holiday_entry(entry)
+    return results
+
+def schedule_holiday_refresh(y: int):
+    """İstek yolundan çağrılır: yeni görülen yılı listeye ekle ve thread'i uyandır.
+
+    Listede zaten olan yıllar periyodik döngüde yenilenir; böylece ağ hatasında
+    upstream'e sıkı döngüyle yüklenilmez.
+    """
+    now_y = datetime.now().year
+    if not (now_y - 1 <= y <= now_y + 2):
+        return
+    with _refresh_years_lock:
+        if y in _refresh_years:
+            return
+        _refresh_years.add(y)
+    start_holiday_refresher()
+    _refresh_wakeup.set()
+
+def _holiday_refresher_loop():
+    while True:
+        try:
+            refresh_holidays()
+        except Exception as e:
+            print(f"Tatil yenileyici hatası: {e}")
+        _refresh_wakeup.wait(HOLIDAY_REFRESH_INTERVAL_SECONDS)
+        _refresh_wakeup.clear()
+
+def start_holiday_refresher():
+    """Worker (process) başına bir kez daemon thread başlat; fork sonrası yeniden başlar."""
+    global _refresher_pid
+    if not HOLIDAY_REFRESH_ENABLED or _refresher_pid == os.getpid():
+        return
+    with _refresher_lock:
+        if _refresher_pid == os.getpid():
+            return
+        threading.Thread(target=_holiday_refresher_loop, name="holiday-refresher", daemon=True).start()
+        _refresher_pid = os.getpid()
+
+@app.cli.command('refresh-holidays')
+def refresh_holidays_command():
+    """Tatil cache'ini tek seferlik yenile (cron / ayrı worker için)."""
     init_db()
+    for y, res in refresh_holidays(force=True).items():
+        print(f"{y}: {res}")
+
+
+# -------------------- /events yanıt cache'i --------------------
+# FullCalendar aynı ay pencerelerini tekrar tekrar ister. Hazır kodlanmış JSON
+# byte'ları (start, end, bugün, veri sürümü, tatil indeksi) anahtarıyla tutulur;
+# istemciye ETag verilir ve değişiklik yoksa 304 döner. Yazımlar data_version
+# trigger'larıyla sürümü artırır; eski anahtarlar LRU ile düşer.
+EVENTS_CACHE_MAX_ENTRIES = int(os.getenv("EVENTS_CACHE_MAX_ENTRIES", "256"))
+# Tatil indeksinin mtime/süre kontrolleri en geç bu aralıkla yeniden yapılır
+EVENTS_CACHE_TTL_SECONDS = int(os.getenv("EVENTS_CACHE_TTL_SECONDS", "300"))
+
+_events_cache = OrderedDict()
+_events_cache_lock = threading.Lock()
+
+def _events_cache_key(start_arg: str, end_arg: str):
+    # Bugünün tarihi anahtarda: geçmiş/gelecek renkleri gün dönünce değişir
+    return (start_arg, end_arg, datetime.now().strftime('%Y-%m-%d'), data_version('calendar'), _holiday_generation)
+
+def _events_cache_get(key):
+    with _events_cache_lock:
+        entry = _events_cache.get(key)
+        if entry is None:
+            return None
+        if time.time() > entry['expires_at']:
+            del _events_cache[key]
+            return None
+        _events_cache.move_to_end(key)
+        return entry
+
+def _events_cache_put(key, body: bytes) -> dict:
+    entry = {
+        'body': body,
+        'etag': hashlib.sha1(body).hexdigest(),
+        'expires_at': time.time() + EVENTS_CACHE_TTL_SECONDS,
+    }
+    with _events_cache_lock:
+        _events_cache[key] = entry
+        while len(_events_cache) > EVENTS_CACHE_MAX_ENTRIES:
+            _events_cache.popitem(last=False)
+    return entry
+
+def _events_response(entry: dict):
+    resp = app.response_class(entry['body'], mimetype='application/json')
+    resp.set_etag(entry['etag'])
+    # Tarayıcı her seferinde ETag ile doğrulasın: değişiklik yoksa 304, eklemeden sonra hemen güncel
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+
+# /events satır kaynağı: sınavlar (kind=0) ve Obst planları (kind=1) tek sorguda.
+# Her iki dal da kendi tarih indeksini kullanır; sıra dallar içinde tarihe göredir.
+EVENT_ROWS_RANGE_SQL = """
+    SELECT * FROM (SELECT 0, id, subject, date, start_time, end_time FROM exams
+                   WHERE date >= ? AND date < ? ORDER BY date)
+    UNION ALL
+    SELECT * FROM (SELECT 1, id, parent_name, date, NULL, NULL FROM obst_schedule
+                   WHERE date >= ? AND date < ? ORDER BY date)
+"""
+EVENT_ROWS_ALL_SQL = """
+    SELECT * FROM (SELECT 0, id, subject, date, start_time, end_time FROM exams ORDER BY date)
+    UNION ALL
+    SELECT * FROM (SELECT 1, id, parent_name, date, NULL, NULL FROM obst_schedule ORDER BY date)
+"""
+
+# Sıcak sorgular: rotalar bu sabitleri kullanır, check_query_plans() aynılarını denetler
+NEXT_EXAM_SQL = "SELECT id, subject, grade, date, start_time, end_time FROM exams WHERE date >= ? ORDER BY date, id LIMIT 1"
+NEXT_EXAM_AFTER_SQL = "SELECT id, subject, grade, date, start_time, end_time FROM exams WHERE date > ? ORDER BY date, id LIMIT 1"
+FUTURE_EXAMS_SQL = "SELECT id, subject, grade, date FROM exams WHERE date >= ? ORDER BY date"
+RECENT_PAST_EXAMS_SQL = "SELECT id, subject, grade, date FROM exams WHERE date < ? ORDER BY date DESC LIMIT 10"
+# /stats/delete-past sayfalaması (keyset): (date, id) imlecinden geriye doğru
+PAST_EXAMS_SQL = "SELECT id, subject, date FROM exams WHERE date < ? ORDER BY date DESC, id DESC LIMIT ?"
+PAST_EXAMS_BEFORE_SQL = (
+    "SELECT id, subject, date FROM exams WHERE date < ? AND (date, id) < (?, ?) "
+    "ORDER BY date DESC, id DESC LIMIT ?"
+)
+UPCOMING_OBST_SQL = "SELECT id, date, parent_name FROM obst_schedule WHERE date >= ? ORDER BY date LIMIT 30"
+OBST_LIST_SQL = "SELECT id, date, parent_name FROM obst_schedule ORDER BY date ASC LIMIT 80"
+# Toplu içe aktarmada mükerrer kontrolü: yalnız içe aktarılan tarih aralığı, indeksten
+# /calendar.ics: pencere başından itibaren tüm Obst günleri (tarih indeksiyle)
+CALENDAR_OBST_SQL = "SELECT id, date, parent_name FROM obst_schedule WHERE date >= ? ORDER BY date"
+IMPORT_EXISTING_KEYS_SQL = "SELECT date, grade, subject, start_time FROM exams WHERE date >= ? AND date <= ?"
+IMPORT_INSERT_SQL = "INSERT INTO exams (date, grade, subject, start_time, end_time) VALUES (?, ?, ?, ?, ?)"
+
+# -------------------- /api/exams sorgu kurucusu --------------------
+# (date, id) üzerinde keyset sayfalama; tüm alanlar idx_exams_date_cover
+# içinde olduğundan filtreler de tabloya dokunmadan indeksten okunur.
+API_EXAMS_FIELDS = ('id', 'date', 'grade', 'subject', 'start_time', 'end_time')
+API_EXAMS_DEFAULT_LIMIT = 100
+API_EXAMS_MAX_LIMIT = 500
+
+def encode_exam_cursor(date_str, exam_id):
+    return f"{date_str}_{exam_id}"
+
+def decode_exam_cursor(raw):
+    """'YYYY-MM-DD_id' → (date, id); geçersizse ValueError."""
+    date_str, _, id_str = (raw or '').partition('_')
+    datetime.strptime(date_str, '%Y-%m-%d')
+    return date_str, int(id_str)
+
+def parse_exam_filters(args):
+    """?grade=&subject=&from=&to= → build_exams_query anahtar argümanları; hatada ValueError."""
+    filters = {
+        'grade': (args.get('grade') or '').strip() or None,
+        'subject': (args.get('subject') or '').strip() or None,
+        'date_from': (args.get('from') or '').strip() or None,
+        'date_to': (args.get('to') or '').strip() or None,
+    }
+    for key in ('date_from', 'date_to'):
+        if filters[key]:
+            # '2027-3-1' de kabul edilir; SQL'deki string karşılaştırması için kanonik biçime çevir
+            try:
+                filters[key] = datetime.strptime(filters[key], '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                raise ValueError("from/to müssen im Format YYYY-MM-DD sein")
+    return filters
+
+def build_exams_query(fields, grade=None, subject=None, date_from=None, date_to=None,
+                      cursor=None, limit=API_EXAMS_DEFAULT_LIMIT):
+    """(sql, params) döndürür. Satırlar imleç için daima (date, id, *fields) biçimindedir."""
+    where, params = [], []
+    if date_from:
+        where.append("date >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("date <= ?")
+        params.append(date_to)
+    if cursor:
+        where.append("(date, id) > (?, ?)")
+        params.extend(cursor)
+    if grade:
+        where.append("grade = ? COLLATE NOCASE")
+        params.append(grade)
+    if subject:
+        where.append("subject = ? COLLATE NOCASE")
+        params.append(subject)
+    sql = f"SELECT {', '.join(('date', 'id') + tuple(fields))} FROM exams"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY date, id LIMIT ?"
+    params.append(limit)
+    return sql, tuple(params)
+
+# -------------------- Sorgu planı denetimi --------------------
+# (sorgu, örnek parametreler). Yeni bir sıcak sorgu eklenince buraya da ekle;
+# `flask --app app check-query-plans` tam tablo taramasına düşen sorguyu yakalar.
+HOT_QUERIES = {
+    'data_version': (DATA_VERSION_SQL, ()),
+    'index_next_exam': (NEXT_EXAM_SQL, ('2026-01-01',)),
+    'index_next_exam_after': (NEXT_EXAM_AFTER_SQL, ('2026-01-01',)),
+    'events_range': (EVENT_ROWS_RANGE_SQL, ('2026-01-01', '2026-02-09', '2026-01-01', '2026-02-09')),
+    'events_all': (EVENT_ROWS_ALL_SQL, ()),
+    'delete_future': (FUTURE_EXAMS_SQL, ('2026-01-01',)),
+    'delete_recent_past': (RECENT_PAST_EXAMS_SQL, ('2026-01-01',)),
+    'stats_delete_past': (PAST_EXAMS_SQL, ('2026-01-01', 200)),
+    'stats_delete_past_before': (PAST_EXAMS_BEFORE_SQL, ('2026-01-01', '2025-06-01', 100, 200)),
+    'obst_upcoming': (UPCOMING_OBST_SQL, ('2026-01-01',)),
+    'stats_obst_list': (OBST_LIST_SQL, ()),
+    'calendar_obst': (CALENDAR_OBST_SQL, ('2025-07-01',)),
+    'import_existing_keys': (IMPORT_EXISTING_KEYS_SQL, ('2026-01-01', '2026-07-31')),
+    'api_exams_first': build_exams_query(API_EXAMS_FIELDS, limit=101),
+    'api_exams_filtered': build_exams_query(('date', 'subject'), grade='4A', subject='Deutsch',
+                                            date_from='2026-01-01', date_to='2026-07-31',
+                                            cursor=('2026-03-01', 10), limit=101),
+}
 
+# Bilerek tam okunan tablolar (plan satırı → gerekçe); check_query_plans bunları sorun saymaz
+ALLOWED_PLAN_SCANS = {
+    'SCAN data_version': "Kapsam başına bir satır (şu an 2), WITHOUT ROWID; tamamı her istekte okunur",
+    'SCAN exam_stats': "Özet tablonun kendisi (gün x sınıf x ders); /stats ve arama sıralaması "
+                       "tüm özeti okur, boyutu exams ile değil gün sayısıyla büyür",
+}
+
+def explain_query_plan(conn, sql: str, params=()):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+def _plan_problems(details):
+    problems = []
+    for detail in details:
+        if detail in ALLOWED_PLAN_SCANS:
+            continue
+        # Tüm tabloyu okumak yalnızca kapsayan indeks üzerinden kabul edilir
+        if detail.startswith("SCAN ") and "COVERING INDEX" not in detail:
+            problems.append(detail)
+        elif "TEMP B-TREE" in detail:
+            problems.append(detail)
+    return problems
+
+def check_query_plans(conn) -> dict:
+    """{sorgu adı: [sorunlu plan satırları]} — boş sözlük her şeyin indeksli olduğu anlamına gelir."""
+    failures = {}
+    for name, (sql, params) in HOT_QUERIES.items():
+        problems = _plan_problems(explain_query_plan(conn, sql, params))
+        if problems:
+            failures[name] = problems
+    return failures
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Sıcak sorguların EXPLAIN QUERY PLAN çıktısını denetle; tarama varsa çıkış kodu 1."""
+    init_db()
+    with get_db_connection() as conn:
+        for name, (sql, params) in HOT_QUERIES.items():
+            print(f"{name}:")
+            for detail in explain_query_plan(conn, sql, params):
+                note = ALLOWED_PLAN_SCANS.get(detail)
+                print(f"    {detail}" + (f"  (izinli: {note})" if note else ""))
+        failures = check_query_plans(conn)
+    if failures:
+        for name, problems in failures.items():
+            print(f"❌ {name}: {'; '.join(problems)}")
+        raise SystemExit(1)
+    print("✅ Tüm sıcak sorgular indeks kullanıyor")
+
+# -------------------- İstatistik motoru --------------------
+# Tüm sayaçlar ve kırılımlar tek sorguda, exams yerine trigger'larla güncel tutulan
+# exam_stats özetinden (gün x sınıf x ders) okunur: maliyet tablo boyutuyla değil
+# gün sayısıyla büyür. GROUP BY yok (geçici B-tree kurulmaz): özet satırları tek
+# geçişte okunur, toplamlar ve kırılımlar Python'da zaten toplanıyor.
+EXAM_STATS_SQL = """
+    SELECT grade, subject, substr(date, 1, 7) AS month,
+           cnt AS total,
+           CASE WHEN date >= ? THEN cnt ELSE 0 END AS upcoming
+    FROM exam_stats
+"""
+HOT_QUERIES['exam_stats'] = (EXAM_STATS_SQL, ('2026-01-01',))
+
+def compute_exam_stats(conn, today: str = None) -> dict:
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    this_month = today[:7]
+    totals = {'total_exams': 0, 'upcoming_exams': 0, 'past_exams': 0, 'this_month_exams': 0}
+    by_subject, by_month, by_grade = {}, {}, {}
+    stat_rows = conn.execute(EXAM_STATS_SQL, (today,)).fetchall()
+    count_rows('exam_stats', len(stat_rows))
+    for grade, subject, month, total, upcoming in stat_rows:
+        upcoming = upcoming or 0
+        totals['total_exams'] += total
+        totals['upcoming_exams'] += upcoming
+        totals['past_exams'] += total - upcoming
+        if month == this_month:
+            totals['this_month_exams'] += total
+        for bucket, key in ((by_subject, subject), (by_month, month), (by_grade, grade)):
+            b = bucket.setdefault(key, [0, 0])
+            b[0] += total
+            b[1] += upcoming
+    return {
+        **totals,
+        'by_subject': [
+            {'subject': k, 'total': t, 'upcoming': u}
+            for k, (t, u) in sorted(by_subject.items(), key=lambda kv: (-kv[1][0], (kv[0] or '').lower()))
+        ],
+        'by_month': [{'month': k, 'total': t, 'upcoming': u} for k, (t, u) in sorted(by_month.items())],
+        'by_grade': [{'grade': k, 'total': t, 'upcoming': u} for k, (t, u) in sorted(by_grade.items())],
+    }
 
 # -------------------- Routes --------------------
 @app.route("/")
@@ -303,11 +1667,7 @@ def index():
         now = datetime.now(ZoneInfo('Europe/Berlin')) if ZoneInfo else datetime.now()
         today = now.strftime('%Y-%m-%d')
         after_cutoff = now.hour >= 18
-        query = (
-            "SELECT * FROM exams WHERE date > ? ORDER BY date, id LIMIT 1"
-            if after_cutoff
-            else "SELECT * FROM exams WHERE date >= ? ORDER BY date, id LIMIT 1"
-        )
+        query = NEXT_EXAM_AFTER_SQL if after_cutoff else NEXT_EXAM_SQL
         obst_free_count = 0
         obst_next_free_date = None
         with get_db_connection() as conn:
@@ -344,69 +1704,51 @@ def events():
         start_arg = (request.args.get('start') or '')[:10]
         end_arg = (request.args.get('end') or '')[:10]
 
+        # Aynı görünüm aralığı + veri sürümü için hazır kodlanmış yanıtı kullan
+        cache_key = _events_cache_key(start_arg, end_arg)
+        cached = _events_cache_get(cache_key)
+        if cached is not None:
+            return _events_response(cached)
+
+        # Sınavlar + Obst (meyve günü) planları: tek bağlantı, tek sorgu
         with get_db_connection() as conn:
             cur = conn.cursor()
+            cur.row_factory = None  # düz tuple: satır başına Row nesnesi yok
             if start_arg and end_arg:
                 # end_arg FullCalendar'da exclusive (genelde) — burada da exclusive ele al
-                cur.execute('SELECT * FROM exams WHERE date >= ? AND date < ? ORDER BY date', (start_arg, end_arg))
+                cur.execute(EVENT_ROWS_RANGE_SQL, (start_arg, end_arg, start_arg, end_arg))
             else:
-                cur.execute('SELECT * FROM exams ORDER BY date')
-            exams = cur.fetchall()
-            events_list = []
-            today = datetime.now().strftime('%Y-%m-%d')
-            for exam in exams:
-                is_past = exam['date'] < today
-                color = '#dc3545' if is_past else '#007bff'
-                events_list.append({
-                    'id': exam['id'],
-                    'title': exam['subject'],
-                    'start': f"{exam['date']}T{exam['start_time']}",
-                    'end': f"{exam['date']}T{exam['end_time']}",
+                cur.execute(EVENT_ROWS_ALL_SQL)
+            rows = cur.fetchall()
+        count_rows('events_range' if start_arg and end_arg else 'events_all', len(rows))
+        events_list = []
+        append = events_list.append
+        today = datetime.now().strftime('%Y-%m-%d')
+        for kind, row_id, title, d, start_time, end_time in rows:
+            if kind == 0:
+                color = '#dc3545' if d < today else '#007bff'
+                append({
+                    'id': row_id,
+                    'title': title,
+                    'start': f"{d}T{start_time}",
+                    'end': f"{d}T{end_time}",
                     'backgroundColor': color,
                     'borderColor': color
                 })
-
-        # Obst (meyve günü) planları: takvimde tam gün etkinlik olarak göster
-        try:
-            with get_db_connection() as conn:
-                if start_arg and end_arg:
-                    obst_rows = conn.execute(
-                        "SELECT date, parent_name FROM obst_schedule WHERE date >= ? AND date < ? ORDER BY date",
-                        (start_arg, end_arg),
-                    ).fetchall()
-                else:
-                    obst_rows = conn.execute(
-                        "SELECT date, parent_name FROM obst_schedule ORDER BY date",
-                    ).fetchall()
-        except Exception:
-            obst_rows = []
-
-        for row in obst_rows:
-            try:
-                d = (row['date'] if isinstance(row, sqlite3.Row) else row[0])
-                name = (row['parent_name'] if isinstance(row, sqlite3.Row) else row[1])
-                end_ex = (datetime.strptime(d, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
-                events_list.append({
-                    'title': f"Obst: {name}",
+            else:
+                # Obst: takvimde tam gün etkinlik (exclusive end = ertesi gün)
+                try:
+                    end_ex = _ordinal_iso(_date_ordinal(d) + 1)
+                except ValueError:
+                    continue
+                append({
+                    'title': f"Obst: {title}",
                     'start': d,
                     'end': end_ex,
                     'allDay': True,
                     'backgroundColor': '#ffc107',
                     'borderColor': '#ffc107'
                 })
-            except Exception:
-                continue
-        # Bayern ferien-api.de'den güncel tatil tarihlerini çek, olmazsa yedek kullan
-        backup_ferien = [
-            {"start": "2025-03-03", "end": "2025-03-08"},
-            {"start": "2025-04-14", "end": "2025-04-26"},
-            {"start": "2025-06-10", "end": "2025-06-21"},
-            {"start": "2025-08-01", "end": "2025-09-16"},
-            {"start": "2025-11-03", "end": "2025-11-08"},  # Herbstferien 3-7 Kasım (7 dahil)
-            {"start": "2025-11-19", "end": "2025-11-19"},  # Buß- und Bettag (schulfrei)
-            {"start": "2025-12-22", "end": "2026-01-06"},
-        ]
-        ferien_event_count = 0
         # Görünüm aralığına göre ilgili yılları belirle
         years_to_fetch = set()
         try:
@@ -422,208 +1764,130 @@ def events():
             now_y = datetime.now().year
             years_to_fetch.update({now_y, now_y + 1})
 
+        # Ferien + Feiertage arka planları: işlem içi indeksten yalnızca görünüm aralığını al
         try:
-            added_pairs = set()
-            cache_dir = CACHE_DIR
-            fallback_dir = FALLBACK_DIR
-            cache_dir.mkdir(parents=True, exist_ok=True)
-            fallback_dir.mkdir(parents=True, exist_ok=True)
-
-            def _cache_is_fresh(p: Path) -> bool:
-                try:
-                    if not p.exists():
-                        return False
-                    age = time.time() - p.stat().st_mtime
-                    return age <= HOLIDAY_CACHE_TTL_SECONDS
-                except Exception:
-                    return False
-
-            def _read_json_file(p: Path):
-                try:
-                    return json.loads(p.read_text(encoding='utf-8'))
-                except Exception:
-                    return None
-
-            # Hafta sonlarını boyamamak için: verilen aralığı yalnızca hafta içi bloklar halinde arka plan olarak ekle
-            def add_weekday_background_ranges(start_str: str, end_exclusive_str: str) -> int:
-                appended = 0
-                try:
-                    d = datetime.strptime(start_str, "%Y-%m-%d")
-                    end_ex = datetime.strptime(end_exclusive_str, "%Y-%m-%d")
-                except Exception:
-                    return 0
-                run_start = None
-                while d < end_ex:
-                    if d.weekday() < 5:  # 0=Mon .. 4=Fri
-                        if run_start is None:
-                            run_start = d
-                    else:
-                        if run_start is not None:
-                            s = run_start.strftime("%Y-%m-%d")
-                            e = d.strftime("%Y-%m-%d")
-                            key = (s, e)
-                            if key not in added_pairs:
-                                added_pairs.add(key)
-                                events_list.append({
-                                    'start': s,
-                                    'end': e,
-                                    'rendering': 'background',
-                                    'backgroundColor': '#f0f0f0',
-                                    'display': 'background'
-                                })
-                                appended += 1
-                            run_start = None
-                    d += timedelta(days=1)
-                if run_start is not None:
-                    s = run_start.strftime("%Y-%m-%d")
-                    e = end_ex.strftime("%Y-%m-%d")
-                    key = (s, e)
-                    if key not in added_pairs:
-                        added_pairs.add(key)
-                        events_list.append({
-                            'start': s,
-                            'end': e,
-                            'rendering': 'background',
-                            'backgroundColor': '#f0f0f0',
-                            'display': 'background'
-                        })
-                        appended += 1
-                return appended
-            for y in sorted(years_to_fetch):
-                ferien = None
-                ferien_url = f'https://ferien-api.de/api/v1/holidays/BY/{y}'
-                cache_file = cache_dir / f"BY_{y}.json"
-
-                # Cache-first: tazeyse direkt cache oku, dış API'ye çıkma
-                if _cache_is_fresh(cache_file):
-                    ferien = _read_json_file(cache_file)
-
-                # Cache yoksa/eskidiyse network dene
-                if ferien is None:
-                    try:
-                        response = requests.get(ferien_url, timeout=5)
-                        if response.status_code == 200:
-                            ferien = response.json()
-                            # Yalnızca dolu liste döndüyse cache'e yaz (boş [] ise yazma)
-                            try:
-                                if isinstance(ferien, list) and len(ferien) > 0:
-                                    cache_file.write_text(response.text, encoding='utf-8')
-                            except Exception:
-                                pass
-                        else:
-                            raise RuntimeError(f"HTTP {response.status_code}")
-                    except Exception:
-                        # Network yoksa cache (stale da olsa) oku
-                        if cache_file.exists():
-                            ferien = _read_json_file(cache_file)
-
-                # Eğer API boş liste döndüyse veya hiç veri yoksa, yıllık lokal fallback'i dene
-                try:
-                    if not ferien or (isinstance(ferien, list) and len(ferien) == 0):
-                        fb_file = fallback_dir / f"BY_{y}.json"
-                        if fb_file.exists():
-                            try:
-                                ferien = json.loads(fb_file.read_text(encoding='utf-8'))
-                                print(f"ℹ️ Fallback ferien kullanıldı: {fb_file}")
-                            except Exception:
-                                pass
-                except Exception:
-                    pass
-                if not ferien or (isinstance(ferien, list) and len(ferien) == 0):
-                    continue
-                for holiday in ferien:
-                    start = holiday.get('start')
-                    end = holiday.get('end')
-                    if start and end:
-                        end_dt = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)
-                        end_str = end_dt.strftime("%Y-%m-%d")
-                        ferien_event_count += add_weekday_background_ranges(start, end_str)
+            with timed('holiday'):
+                events_list.extend(holiday_background_events(years_to_fetch, start_arg, end_arg))
         except Exception as e:
-            print(f"Ferien API hatası: {e}")
-        # Bayern resmî tatilleri (Feiertage) de arka plan olarak ekle (okullar kapalı)
-        try:
-            feiertage_added = 0
-            for y in sorted(years_to_fetch):
-                feiertage = None
-                feiertage_url = f'https://date.nager.at/api/v3/PublicHolidays/{y}/DE'
-                cache_file = FEIERTAGE_CACHE_DIR / f"DE_{y}.json"
-                # Cache-first
-                if _cache_is_fresh(cache_file):
-                    feiertage = _read_json_file(cache_file)
-
-                if feiertage is None:
-                    try:
-                        resp = requests.get(feiertage_url, timeout=5)
-                        if resp.status_code == 200:
-                            feiertage = resp.json()
-                            # doluysa cachele
-                            try:
-                                if isinstance(feiertage, list) and len(feiertage) > 0:
-                                    cache_file.write_text(resp.text, encoding='utf-8')
-                            except Exception:
-                                pass
-                        else:
-                            raise RuntimeError(f"HTTP {resp.status_code}")
-                    except Exception:
-                        if cache_file.exists():
-                            feiertage = _read_json_file(cache_file)
-                if not feiertage or (isinstance(feiertage, list) and len(feiertage) == 0):
-                    continue
-                for ft in feiertage:
-                    try:
-                        # Yalnızca Bavyera için geçerli olan veya ülke çapında (global) olan tatilleri al
-                        is_global = bool(ft.get('global'))
-                        counties = ft.get('counties') or []
-                        applies_to_by = is_global or ('DE-BY' in counties)
-                        if not applies_to_by:
-                            continue
-                        date_str = ft.get('date')  # YYYY-MM-DD
-                        if not date_str:
-                            continue
-                        # Tek günlük background event: end = date + 1 gün (exclusive end)
-                        start_dt = datetime.strptime(date_str, "%Y-%m-%d")
-                        # Hafta sonu ise atla (yalnızca hafta içi önemli)
-                        if start_dt.weekday() >= 5:
-                            continue
-                        end_dt = start_dt + timedelta(days=1)
-                        end_str = end_dt.strftime("%Y-%m-%d")
-                        key = (date_str, end_str)
-                        # Aynı aralık daha önce eklendiyse atla
-                        if key in added_pairs:
-                            continue
-                        added_pairs.add(key)
-                        events_list.append({
-                            'start': date_str,
-                            'end': end_str,
-                            'rendering': 'background',
-                            'backgroundColor': '#f0f0f0',
-                            'display': 'background'
-                        })
-                        feiertage_added += 1
-                    except Exception:
-                        continue
-        except Exception as e:
-            print(f"Feiertage çekme hatası: {e}")
-        # Eğer API'dan hiç tatil eklenmediyse yedekleri ekle (hafta sonlarını atla)
-        if ferien_event_count == 0:
-            print("Ferien API'dan hiç tatil eklenmedi, yedekler kullanılıyor.")
-            for holiday in backup_ferien:
-                try:
-                    # backup 'end' değerini inclusive kabul edip +1 günle exclusive'e çevir
-                    start_incl = holiday['start']
-                    end_incl = holiday['end']
-                    end_ex = (datetime.strptime(end_incl, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
-                    _ = add_weekday_background_ranges(start_incl, end_ex)
-                except Exception:
-                    continue
-        resp = jsonify(events_list)
-        # Kısa süreli cache: aynı görünüm aralığı için tekrar hesaplamayı azaltır
-        resp.headers['Cache-Control'] = 'public, max-age=60'
-        return resp
+            print(f"Tatil indeksi hatası: {e}")
+        with timed('json'):
+            body = json.dumps(events_list, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return _events_response(_events_cache_put(cache_key, body))
     except Exception as e:
         print(f"❌ Events error: {e}")
         return jsonify([])
 
+# -------------------- /events/stream (Server-Sent Events) --------------------
+# Takvim açık olan sayfalar bu akışa bağlanır; exams/Obst değişince küçük bir
+# "changed" olayı (yeni data_version ile) gönderilir ve sayfa yalnızca o zaman
+# /events'i yeniden çeker. Process başına tek bir izleyici thread data_version
+# satırını yoklar ve abonelere Condition ile haber verir: abone başına DB
+# bağlantısı tutulmaz, worker'lar arası değişiklikler de SQLite üzerinden görülür.
+EVENTS_STREAM_POLL_SECONDS = float(os.getenv("EVENTS_STREAM_POLL_SECONDS", "1.0"))
+EVENTS_STREAM_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_STREAM_HEARTBEAT_SECONDS", "20"))
+# Bağlantı bu süreden sonra kapanır; EventSource otomatik yeniden bağlanır
+EVENTS_STREAM_MAX_SECONDS = float(os.getenv("EVENTS_STREAM_MAX_SECONDS", "300"))
+# Her akış bir worker thread'ini meşgul eder; geri kalanı normal isteklere kalsın
+EVENTS_STREAM_MAX_CLIENTS = int(os.getenv("EVENTS_STREAM_MAX_CLIENTS", "4"))
+EVENTS_STREAM_RETRY_MS = 5000
+# Sınır doluyken 503 yerine yalnızca daha uzun bir `retry:` gönderilip kapatılır:
+# EventSource 200 olmayan yanıtı kalıcı hata sayar ve bir daha bağlanmaz
+EVENTS_STREAM_BUSY_RETRY_MS = int(os.getenv("EVENTS_STREAM_BUSY_RETRY_MS", "30000"))
+
+_stream_cond = threading.Condition()
+_stream_subscribers = 0
+_stream_version = None  # izleyicinin en son gördüğü calendar sürümü
+_stream_watcher_pid = None
+
+def _stream_watcher_loop():
+    global _stream_version
+    while True:
+        with _stream_cond:
+            # Abone yokken DB'yi yoklama
+            _stream_cond.wait_for(lambda: _stream_subscribers > 0)
+        try:
+            with get_db_connection() as conn:
+                version = read_data_versions(conn).get('calendar', 0)
+        except Exception as e:
+            print(f"SSE izleyici hatası: {e}")
+            version = None
+        if version is not None and version != _stream_version:
+            with _stream_cond:
+                if _stream_subscribers > 0:
+                    _stream_version = version
+                    _stream_cond.notify_all()
+        time.sleep(EVENTS_STREAM_POLL_SECONDS)
+
+def _start_stream_watcher():
+    """Process başına bir kez (fork sonrası yeniden) izleyici thread'i başlat."""
+    global _stream_watcher_pid
+    if _stream_watcher_pid == os.getpid():
+        return
+    with _stream_cond:
+        if _stream_watcher_pid == os.getpid():
+            return
+        threading.Thread(target=_stream_watcher_loop, name="sse-version-watcher", daemon=True).start()
+        _stream_watcher_pid = os.getpid()
+
+def _sse(event: str, version: int) -> str:
+    return f"event: {event}\nid: {version}\ndata: {json.dumps({'calendar': version})}\n\n"
+
+def _calendar_event_stream(last_seen: int):
+    deadline = time.monotonic() + EVENTS_STREAM_MAX_SECONDS
+    # İlk çerçeve başlangıç sürümünü id olarak taşır: hiç "changed" gelmeden kapanan
+    # bağlantıda da EventSource Last-Event-ID ile döner, aradaki yazma kaçmaz
+    yield f"retry: {EVENTS_STREAM_RETRY_MS}\nid: {last_seen}\n\n"
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        with _stream_cond:
+            _stream_cond.wait_for(
+                lambda: _stream_version is not None and _stream_version > last_seen,
+                timeout=min(EVENTS_STREAM_HEARTBEAT_SECONDS, remaining),
+            )
+            current = _stream_version
+        # Sürümler yalnızca artar: eski (ör. önceki aboneden kalan) değer istemciyi geri götürmesin
+        if current is not None and current > last_seen:
+            last_seen = current
+            yield _sse('changed', current)
+        else:
+            # Heartbeat: proxy'ler bağlantıyı açık tutar, kopan istemci yazmada fark edilir
+            yield ": ping\n\n"
+
+def _stream_unsubscribe():
+    global _stream_subscribers, _stream_version
+    with _stream_cond:
+        _stream_subscribers -= 1
+        if _stream_subscribers == 0:
+            # İzleyici duraklar; bir sonraki abone bayat sürümü görmesin
+            _stream_version = None
+
+@app.route('/events/stream')
+def events_stream():
+    global _stream_subscribers
+    _start_stream_watcher()
+    # Yeniden bağlanan istemci son gördüğü sürümü Last-Event-ID ile bildirir;
+    # ilk bağlantıda güncel sürüm başlangıç noktasıdır (hemen "changed" gönderilmez).
+    try:
+        last_seen = int(request.headers.get('Last-Event-ID') or 0) or data_version('calendar')
+    except ValueError:
+        last_seen = data_version('calendar')
+    with _stream_cond:
+        if _stream_subscribers >= EVENTS_STREAM_MAX_CLIENTS:
+            resp = Response(f"retry: {EVENTS_STREAM_BUSY_RETRY_MS}\nid: {last_seen}\n\n",
+                            mimetype='text/event-stream')
+            resp.headers['Cache-Control'] = 'no-cache'
+            return resp
+        _stream_subscribers += 1
+        _stream_cond.notify_all()
+    resp = Response(_calendar_event_stream(last_seen), mimetype='text/event-stream')
+    # Üreteç hiç başlamasa da (istemci hemen koparsa) sayaç geri alınır
+    resp.call_on_close(_stream_unsubscribe)
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
 @app.route('/obst', methods=['GET', 'POST'])
 def obst():
     error = None
@@ -691,7 +1955,7 @@ def obst():
     try:
         with get_db_connection() as conn:
             plans = conn.execute(
-                "SELECT id, date, parent_name FROM obst_schedule WHERE date >= ? ORDER BY date LIMIT 30",
+                UPCOMING_OBST_SQL,
                 (today,),
             ).fetchall()
 
@@ -699,6 +1963,8 @@ def obst():
                 "SELECT date FROM obst_schedule",
             ).fetchall()
             taken_dates = {r['date'] for r in taken_rows}
+        count_rows('obst_upcoming', len(plans))
+        count_rows('obst_taken_dates', len(taken_rows))
     except Exception:
         plans = []
         taken_dates = set()
@@ -816,9 +2082,11 @@ def delete_exam():
         with get_db_connection() as conn:
             # Gelecekteki sınavlar + son 10 geçmiş sınav (birlikte göster)
             today_str = datetime.now().strftime('%Y-%m-%d')
-            future = conn.execute("SELECT * FROM exams WHERE date >= ? ORDER BY date", (today_str,)).fetchall()
-            past10 = conn.execute("SELECT * FROM exams WHERE date < ? ORDER BY date DESC LIMIT 10", (today_str,)).fetchall()
+            future = conn.execute(FUTURE_EXAMS_SQL, (today_str,)).fetchall()
+            past10 = conn.execute(RECENT_PAST_EXAMS_SQL, (today_str,)).fetchall()
             rows = list(future) + list(past10)
+        count_rows('delete_future', len(future))
+        count_rows('delete_recent_past', len(past10))
         # Her satıra biçimlenmiş tarih ekle
         exams = []
         today_str = datetime.now().strftime('%Y-%m-%d')
@@ -845,8 +2113,44 @@ def delete_exam():
         print("❌ Delete exam error:", e)
         return render_template("delete.html", exams=[], error=str(e))
 
-@login_required
+# Sayfa başına satır; cursor'dan fetchmany ile parça parça okunur ve şablon
+# akış (stream) olarak gönderilir, böylece bellek satır sayısından bağımsızdır.
+PAST_EXAMS_PAGE_SIZE = int(os.getenv("PAST_EXAMS_PAGE_SIZE", "200"))
+PAST_EXAMS_FETCH_SIZE = 50
+PAST_EXAMS_STREAM_BUFFER = 25  # kaç şablon parçası birikince flush edilsin
+
+def _parse_past_cursor(args):
+    """?before_date=YYYY-MM-DD&before_id=N → (date, id) ya da None."""
+    before_date = (args.get('before_date') or '').strip()
+    before_id = (args.get('before_id') or '').strip()
+    if not before_date or not before_id:
+        return None
+    try:
+        datetime.strptime(before_date, '%Y-%m-%d')
+        return before_date, int(before_id)
+    except ValueError:
+        return None
+
+def _iter_past_exams(today_str, cursor, limit):
+    """Geçmiş sınavları (date DESC, id DESC) sırasıyla, fetchmany ile üretir."""
+    sent = 0
+    with get_db_connection() as conn:
+        if cursor:
+            cur = conn.execute(PAST_EXAMS_BEFORE_SQL, (today_str, cursor[0], cursor[1], limit))
+        else:
+            cur = conn.execute(PAST_EXAMS_SQL, (today_str, limit))
+        try:
+            while True:
+                rows = cur.fetchmany(PAST_EXAMS_FETCH_SIZE)
+                if not rows:
+                    break
+                sent += len(rows)
+                yield from rows
+        finally:
+            count_rows('stats_delete_past_before' if cursor else 'stats_delete_past', sent)
+
 @app.route("/stats/delete-past", methods=["GET", "POST"])
+@login_required
 def stats_delete_past():
     """Geçmiş sınavları yalnız stats yetkisi ile silebilme sayfası"""
     try:
@@ -856,1258 +2160,769 @@ def stats_delete_past():
                 with get_db_connection() as conn:
                     conn.execute("DELETE FROM exams WHERE id = ?", (exam_id,))
                     conn.commit()
-            return redirect(url_for('stats_delete_past'))
-        with get_db_connection() as conn:
-            today_str = datetime.now().strftime('%Y-%m-%d')
-            rows = conn.execute("SELECT * FROM exams WHERE date < ? ORDER BY date DESC", (today_str,)).fetchall()
-        # Basit liste HTML
-        items = "".join([
-            f"<tr><td>{r['id']}</td><td>{r['subject']}</td><td>{r['date']}</td>"
-            f"<td><form method='post' style='display:inline'>"
-            f"<input type='hidden' name='exam_id' value='{r['id']}'/>"
-            f"<button type='submit' style='background:#dc3545;color:#fff;border:none;padding:6px 10px;border-radius:6px;cursor:pointer'>Löschen</button>"
-            f"</form></td></tr>" for r in rows
-        ])
-        return f"""
-        <!DOCTYPE html>
-        <html><head><meta charset='UTF-8'>
-        <meta name='viewport' content='width=device-width, initial-scale=1.0'>
-        <title>Vergangene Prüfungen</title>
-        <style>
-            body {{ font-family: system-ui, -apple-system, sans-serif; padding: 12px; background: #f5f5f5; }}
-            h1 {{ font-size: 1.3em; margin: 0 0 12px 0; }}
-            table {{ width: 100%; border-collapse: collapse; background: #fff; border-radius: 8px; overflow: hidden; box-shadow: 0 1px 3px rgba(0,0,0,.1); }}
-            th, td {{ padding: 8px; border-bottom: 1px solid #eee; text-align: left; font-size: .95em; }}
-            th {{ background: #f8f9fa; }}
-            a.back {{ display:inline-block; margin-bottom:10px; text-decoration:none; color:#667eea; font-weight:600; }}
-        </style>
-        </head><body>
-            <a class='back' href='/stats'>← Stats</a>
-            <h1>⌛ Vergangene Prüfungen (Löschen)</h1>
-            <table>
-                <tr><th>ID</th><th>Fach</th><th>Datum</th><th>Aktion</th></tr>
-                {items}
-            </table>
-        </body></html>
-        """
+            # Silmeden sonra aynı sayfaya (imleçle birlikte) dön
+            return redirect(url_for('stats_delete_past', **request.args))
+        today_str = datetime.now().strftime('%Y-%m-%d')
+        cursor = _parse_past_cursor(request.args)
+        stream = app.jinja_env.get_template('stats_delete_past.html').stream(
+            exams=_iter_past_exams(today_str, cursor, PAST_EXAMS_PAGE_SIZE),
+            page_size=PAST_EXAMS_PAGE_SIZE,
+            is_first_page=cursor is None,
+        )
+        stream.enable_buffering(PAST_EXAMS_STREAM_BUFFER)
+        return Response(stream_with_context(stream), mimetype='text/html')
     except Exception as e:
         return f"Fehler: {e}", 500
 
-# Sağlık kontrolü (log ve yol teyidi için)
-@app.route("/health")
-def health():
+# -------------------- Sağlık kontrolleri --------------------
+# /healthz: canlılık (process ayakta mı), SQLite'a hiç dokunmaz.
+# /readyz: hazır olma; DB gecikmesi, şema sürümü, WAL boyutu, tatil cache
+# tazeliği ve bağlantı havuzu. Rapor birkaç saniye önbellekte tutulur ve
+# aynı anda gelen yoklamalardan yalnızca biri ölçüm yapar.
+READYZ_CACHE_SECONDS = float(os.getenv("READYZ_CACHE_SECONDS", "5"))
+_HEALTHZ_BODY = b'{"ok":true}'
+_PROCESS_STARTED_AT = time.time()
+
+_readyz_report = None  # (hesaplandığı an, rapor, http durum kodu)
+_readyz_lock = threading.Lock()
+
+def _age_seconds(ts):
+    return None if ts is None else round(time.time() - ts, 1)
+
+def _holiday_readiness() -> dict:
+    """Yıl başına cache dosyalarının yaşı ve indeks kaydı; indeks kurmaz, ağa çıkmaz."""
+    with _holiday_generation_lock:
+        indexed = dict(_holiday_index)
+    out = {}
+    for y in sorted(_default_refresh_years() | set(indexed)):
+        ferien_cache, _, feiertage_cache = _holiday_source_files(y)
+        entry = indexed.get(y)
+        out[str(y)] = {
+            'ferien_cache_age': _age_seconds(_file_mtime(ferien_cache)),
+            'feiertage_cache_age': _age_seconds(_file_mtime(feiertage_cache)),
+            'fresh': _cache_is_fresh(ferien_cache) and _cache_is_fresh(feiertage_cache),
+            'index_age': _age_seconds(entry['built_at']) if entry else None,
+        }
+    return out
+
+def _wal_size_bytes():
+    try:
+        return os.path.getsize(f"{DB_PATH}-wal")
+    except OSError:
+        return 0
+
+def build_readiness_report():
+    """(rapor, http durum kodu). DB erişilemez ya da şema geride ise 503."""
+    report = {'ok': True, 'pid': os.getpid(), 'uptime': _age_seconds(_PROCESS_STARTED_AT)}
+    t0 = time.perf_counter()
     try:
-        init_db()
         with get_db_connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+            schema = conn.execute("PRAGMA user_version").fetchone()[0]
             mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
-        return jsonify({"ok": True, "db": DB_PATH, "journal_mode": mode})
+        report['db'] = {
+            'ok': schema >= SCHEMA_VERSION,
+            'latency_ms': round((time.perf_counter() - t0) * 1000, 2),
+            'schema_version': schema,
+            'expected_schema_version': SCHEMA_VERSION,
+            'journal_mode': mode,
+        }
+    except Exception as e:
+        report['db'] = {'ok': False, 'error': str(e),
+                        'latency_ms': round((time.perf_counter() - t0) * 1000, 2)}
+    report['wal_bytes'] = _wal_size_bytes()
+    report['pool'] = _db_pool.stats()
+    try:
+        report['holidays'] = _holiday_readiness()
     except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
+        report['holidays'] = {'error': str(e)}
+    report['ok'] = report['db']['ok']
+    return report, (200 if report['ok'] else 503)
+
+def get_readiness_report():
+    global _readyz_report
+    cached = _readyz_report
+    if cached is not None and time.monotonic() - cached[0] < READYZ_CACHE_SECONDS:
+        return cached
+    with _readyz_lock:
+        cached = _readyz_report
+        if cached is None or time.monotonic() - cached[0] >= READYZ_CACHE_SECONDS:
+            report, status = build_readiness_report()
+            cached = _readyz_report = (time.monotonic(), report, status)
+    return cached
+
+@app.route("/healthz")
+def healthz():
+    resp = app.response_class(_HEALTHZ_BODY, mimetype='application/json')
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+@app.route("/readyz")
+def readyz():
+    checked_at, report, status = get_readiness_report()
+    resp = jsonify(dict(report, checked_ago=round(time.monotonic() - checked_at, 2)))
+    resp.status_code = status
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+# Eski sağlık kontrolü adresi (log ve yol teyidi için): önbellekli rapordan cevaplar
+@app.route("/health")
+def health():
+    _, report, status = get_readiness_report()
+    db = report['db']
+    body = {"ok": report['ok'], "db": DB_PATH, "journal_mode": db.get('journal_mode')}
+    if not report['ok']:
+        body['error'] = db.get('error') or 'schema out of date'
+    return jsonify(body), (200 if report['ok'] else 500)
+
+# İstek süreleri (bu worker process'i için): rota ve alt aralık histogramları
+@app.route('/stats/timings')
+@login_required
+def stats_timings():
+    resp = jsonify(timing_snapshot())
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+# Prometheus scrape: tüm worker process'lerinin sayaçları toplanmış hâlde
+@app.route('/metrics')
+def metrics():
+    if METRICS_TOKEN:
+        auth = request.headers.get('Authorization', '')
+        token = auth[7:].strip() if auth.startswith('Bearer ') else (request.args.get('token') or '').strip()
+        if not secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            return "Nicht autorisiert", 403
+    resp = Response(render_metrics(), mimetype='text/plain')
+    resp.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+# ---- Veri sürümü API (public, read-only) ----
+# İstemciler bunu yoklayıp yalnızca sürüm değişince yeniden çekebilir.
+@app.route('/api/version')
+def api_version():
+    versions = get_data_versions()
+    resp = jsonify(versions)
+    resp.set_etag('-'.join(f"{k}{v}" for k, v in sorted(versions.items())))
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+@app.after_request
+def _add_data_version_headers(resp):
+    # Yalnızca bu istekte sürüm zaten okunduysa (ek sorgu yok)
+    versions = g.get('data_versions')
+    if versions:
+        resp.headers['X-Data-Version'] = str(versions.get('calendar', 0))
+        resp.headers['X-Subjects-Version'] = str(versions.get('subjects', 0))
+    return resp
+
+# -------------------- Ders kataloğu --------------------
+# Varsayılan havuz + DB'deki eklenenler = BİRLEŞİK, sıralı liste. /api/subjects,
+# /stats (ve arama) bunu paylaşır; yalnızca 'subjects' data_version değişince
+# (trigger'lar: stats_subjects_add/delete) yeniden kurulur. JSON gövdesi hazır
+# kodlanmış byte olarak tutulur.
+DEFAULT_SUBJECT_POOL = ['Mathematik','Deutsch','HSU','Englisch','Ethik','Religion','Musik']
+
+_subject_catalog = None
+_subject_catalog_lock = threading.Lock()
+
+def _build_subject_catalog(conn) -> dict:
+    version = read_data_versions(conn).get('subjects', 0)
+    rows = conn.execute("SELECT id, name FROM subjects").fetchall()
+    count_rows('subject_catalog', len(rows))
+    db_ids = {(r['name'] or '').strip().lower(): r['id'] for r in rows}
+    seen = set()
+    names = []
+    for name in DEFAULT_SUBJECT_POOL + [r['name'] for r in rows]:
+        if not name:
+            continue
+        key = name.strip()
+        if not key:
+            continue
+        lk = key.lower()
+        if lk not in seen:
+            seen.add(lk)
+            names.append(key)
+    names.sort(key=lambda s: s.lower())
+    body = json.dumps({"subjects": names}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return {
+        'version': version,
+        'names': names,
+        # Yönetim listesi: DB'de olanlar silinebilir (id), varsayılanlar 'Standard'
+        'entries': [{'name': n, 'id': db_ids.get(n.lower())} for n in names],
+        'body': body,
+        'etag': hashlib.sha1(body).hexdigest(),
+    }
+
+def get_subject_catalog() -> dict:
+    global _subject_catalog
+    version = data_version('subjects')
+    catalog = _subject_catalog
+    if catalog is not None and catalog['version'] == version:
+        return catalog
+    with _subject_catalog_lock:
+        catalog = _subject_catalog
+        if catalog is None or catalog['version'] != version:
+            with get_db_connection() as conn:
+                catalog = _build_subject_catalog(conn)
+            _subject_catalog = catalog
+    return catalog
 
 # ---- Subjects API (public, read-only) ----
 @app.route('/api/subjects')
 def api_subjects():
     try:
-        # Varsayılan havuz + DB'deki eklenenler = BİRLEŞİK liste (benzersiz)
-        default_pool = ['Mathematik','Deutsch','HSU','Englisch','Ethik','Religion','Musik']
-        with get_db_connection() as conn:
-            rows = conn.execute("SELECT name FROM subjects").fetchall()
-        seen = set()
-        merged = []
-        for name in default_pool + [r['name'] for r in rows]:
-            if not name:
-                continue
-            key = name.strip()
-            if not key:
-                continue
-            lk = key.lower()
-            if lk not in seen:
-                seen.add(lk)
-                merged.append(key)
-        merged.sort(key=lambda s: s.lower())
-        return jsonify({"subjects": merged})
+        catalog = get_subject_catalog()
     except Exception as e:
         return jsonify({"subjects": [], "error": str(e)}), 500
+    resp = app.response_class(catalog['body'], mimetype='application/json')
+    resp.set_etag(catalog['etag'])
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+# ---- Ders arama (typeahead) ----
+# GET /api/subjects/search?q=mathe&limit=8 → {"q": ..., "subjects": [...]}
+# Katalog adları ve her kelimenin başı katlanmış (casefold + aksan/umlaut'suz)
+# anahtarlarla sıralı bir listede tutulur; önek araması bisect ile yapılır.
+# Sonuçlar exams'te kaç kez geçtiğine (exam_stats) göre sıralanır. İndeks
+# ders kataloğu ve takvim sürümü değişince yeniden kurulur.
+SUBJECT_SEARCH_DEFAULT_LIMIT = 8
+SUBJECT_SEARCH_MAX_LIMIT = 20
+SUBJECT_FREQUENCY_SQL = "SELECT subject, cnt FROM exam_stats"
+HOT_QUERIES['subject_frequency'] = (SUBJECT_FREQUENCY_SQL, ())
+
+_subject_search_index = None
+_subject_search_lock = threading.Lock()
+
+def fold_subject(text: str) -> str:
+    """'Übung' → 'ubung', 'Straße' → 'strasse': büyük/küçük harf ve aksan duyarsız anahtar."""
+    decomposed = unicodedata.normalize('NFKD', (text or '').strip().casefold())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def _build_subject_search_index(catalog: dict, calendar_version: int) -> dict:
+    with get_db_connection() as conn:
+        counts = {}
+        for subject, total in conn.execute(SUBJECT_FREQUENCY_SQL):
+            key = fold_subject(subject)
+            counts[key] = counts.get(key, 0) + (total or 0)
+    # Sıralama anahtarı: en sık kullanılan önce, eşitlikte alfabetik
+    rank = {name: (-counts.get(fold_subject(name), 0), name.lower()) for name in catalog['names']}
+    prefixes = []
+    for name in catalog['names']:
+        folded = fold_subject(name)
+        words = folded.split()
+        keys = {folded} | {' '.join(words[i:]) for i in range(1, len(words))}
+        prefixes.extend((key, name) for key in keys)
+    prefixes.sort()
+    return {
+        'version': (catalog['version'], calendar_version),
+        'keys': [k for k, _ in prefixes],
+        'names': [n for _, n in prefixes],
+        'rank': rank,
+        'top': sorted(catalog['names'], key=rank.__getitem__),
+    }
+
+def get_subject_search_index() -> dict:
+    global _subject_search_index
+    catalog = get_subject_catalog()
+    version = (catalog['version'], data_version('calendar'))
+    index = _subject_search_index
+    if index is not None and index['version'] == version:
+        return index
+    with _subject_search_lock:
+        index = _subject_search_index
+        if index is None or index['version'] != version:
+            index = _build_subject_search_index(catalog, version[1])
+            _subject_search_index = index
+    return index
+
+def search_subjects(query: str, limit: int = SUBJECT_SEARCH_DEFAULT_LIMIT) -> list:
+    index = get_subject_search_index()
+    q = fold_subject(query)
+    if not q:
+        return index['top'][:limit]
+    keys, names = index['keys'], index['names']
+    found = set()
+    i = bisect.bisect_left(keys, q)
+    while i < len(keys) and keys[i].startswith(q):
+        found.add(names[i])
+        i += 1
+    return sorted(found, key=index['rank'].__getitem__)[:limit]
+
+@app.route('/api/subjects/search')
+def api_subjects_search():
+    q = (request.args.get('q') or '')[:64]
+    try:
+        limit = int(request.args.get('limit') or SUBJECT_SEARCH_DEFAULT_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit muss eine Zahl sein"}), 400
+    limit = max(1, min(limit, SUBJECT_SEARCH_MAX_LIMIT))
+    try:
+        return jsonify({"q": q, "subjects": search_subjects(q, limit)})
+    except Exception as e:
+        return jsonify({"q": q, "subjects": [], "error": str(e)}), 500
+
+# ---- Exams API (public, read-only) ----
+# GET /api/exams?grade=&subject=&from=&to=&fields=id,date,subject&limit=&cursor=
+# Yanıt: {"items": [...], "next_cursor": "..."}; next_cursor null ise son sayfa.
+@app.route('/api/exams')
+def api_exams():
+    args = request.args
+    fields = [f.strip() for f in (args.get('fields') or '').split(',') if f.strip()] or list(API_EXAMS_FIELDS)
+    unknown = [f for f in fields if f not in API_EXAMS_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unbekannte Felder: {', '.join(unknown)}"}), 400
+    try:
+        limit = int(args.get('limit') or API_EXAMS_DEFAULT_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit muss eine Zahl sein"}), 400
+    limit = max(1, min(limit, API_EXAMS_MAX_LIMIT))
+    try:
+        filters = parse_exam_filters(args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    cursor = None
+    if args.get('cursor'):
+        try:
+            cursor = decode_exam_cursor(args.get('cursor'))
+        except ValueError:
+            return jsonify({"error": "Ungültiger cursor"}), 400
+
+    # Bir fazla satır iste: varsa sonraki sayfa vardır
+    sql, params = build_exams_query(fields, cursor=cursor, limit=limit + 1, **filters)
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = None
+            rows = cur.execute(sql, params).fetchall()
+    except Exception as e:
+        return jsonify({"items": [], "next_cursor": None, "error": str(e)}), 500
+    count_rows('api_exams_filtered' if any(filters.values()) else 'api_exams_first', len(rows))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_exam_cursor(rows[-1][0], rows[-1][1])
+    items = [dict(zip(fields, r[2:])) for r in rows]
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+# ---- Toplu sınav içe aktarma (admin) ----
+# POST /api/exams/import, JSON ([{...}] ya da {"exams": [...]}) veya CSV (başlık satırlı,
+# ',' ya da ';' ayraçlı; gövde olarak ya da 'file' yüklemesi). Sütunlar:
+# date, grade, subject, start_time, end_time (grade/saatler isteğe bağlı).
+# Önce tüm satırlar doğrulanır; biri bile hatalıysa hiçbir şey yazılmaz (400).
+# Mükerrer anahtarı: (date, grade, subject, start_time), büyük/küçük harf duyarsız.
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "10000"))
+
+def _read_import_rows():
+    """İstek gövdesini satır sözlükleri listesine çevirir; biçim hatasında ValueError."""
+    upload = request.files.get('file')
+    if upload is not None:
+        text = upload.read().decode('utf-8-sig')
+    elif request.is_json:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get('exams')
+        if not isinstance(payload, list):
+            raise ValueError("JSON muss eine Liste oder {\"exams\": [...]} sein")
+        return payload
+    else:
+        text = request.get_data(as_text=True).lstrip('\ufeff')
+    header = text.split('\n', 1)[0]
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    reader = csv.DictReader(io.StringIO(text), delimiter=delimiter)
+    if not reader.fieldnames or 'date' not in [(f or '').strip().lower() for f in reader.fieldnames]:
+        raise ValueError("CSV braucht eine Kopfzeile mit mindestens date und subject")
+    return [{(k or '').strip().lower(): v for k, v in row.items()} for row in reader]
+
+def _validate_import_row(raw, today_str):
+    """(date, grade, subject, start_time, end_time) ya da hata metni döndürür."""
+    if not isinstance(raw, dict):
+        return None, "Zeile ist kein Objekt"
+    def field(name, default=''):
+        value = raw.get(name)
+        return default if value is None else (str(value).strip() or default)
+    date_str = field('date')
+    subject = field('subject')
+    grade = field('grade', '4A')
+    start_time = field('start_time', '08:00')
+    end_time = field('end_time', '16:00')
+    if not date_str or not subject:
+        return None, "date und subject sind Pflichtfelder"
+    # strptime '2027-1-5' / '8:00' gibi sıfırsız değerleri de kabul eder; string
+    # karşılaştırmaları ve aralık sorguları doğru çalışsın diye kanonik biçim saklanır
+    try:
+        date_str = datetime.strptime(date_str, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None, f"Ungültiges Datum: {date_str}"
+    if date_str < today_str:
+        return None, "Datum liegt in der Vergangenheit"
+    if len(subject) > 64 or len(grade) > 16:
+        return None, "subject/grade zu lang"
+    times = []
+    for t in (start_time, end_time):
+        try:
+            times.append(datetime.strptime(t, '%H:%M'))
+        except ValueError:
+            return None, f"Ungültige Uhrzeit: {t}"
+    if times[1] < times[0]:
+        return None, "end_time liegt vor start_time"
+    start_time, end_time = (t.strftime('%H:%M') for t in times)
+    return (date_str, grade, subject, start_time, end_time), None
+
+def _import_key(date_str, grade, subject, start_time):
+    return date_str, grade.casefold(), subject.casefold(), start_time
+
+def import_exams(conn, rows):
+    """Doğrulanmış satırları tek IMMEDIATE işlemde executemany ile ekler.
 
+    Satır başına {'row', 'status': 'created'|'duplicate', 'id'?} listesi döndürür.
+    """
+    results = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        dates = [r[0] for r in rows]
+        seen = {
+            _import_key(*r)
+            for r in conn.execute(IMPORT_EXISTING_KEYS_SQL, (min(dates), max(dates)))
+        } if rows else set()
+        count_rows('import_existing_keys', len(seen))
+        to_insert = []
+        for i, r in enumerate(rows, start=1):
+            key = _import_key(r[0], r[1], r[2], r[3])
+            if key in seen:
+                results.append({'row': i, 'status': 'duplicate'})
+                continue
+            seen.add(key)
+            to_insert.append(r)
+            results.append({'row': i, 'status': 'created'})
+        if to_insert:
+            conn.executemany(IMPORT_INSERT_SQL, to_insert)
+            # IMMEDIATE kilidi altında tek yazıcıyız: AUTOINCREMENT id'leri ardışık
+            last_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'exams'").fetchone()[0]
+            next_id = last_id - len(to_insert) + 1
+            for res in results:
+                if res['status'] == 'created':
+                    res['id'] = next_id
+                    next_id += 1
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return results
+
+@app.route('/api/exams/import', methods=['POST'])
 @login_required
+def api_exams_import():
+    try:
+        raw_rows = _read_import_rows()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": str(e)}), 400
+    if not raw_rows:
+        return jsonify({"error": "Keine Zeilen"}), 400
+    if len(raw_rows) > IMPORT_MAX_ROWS:
+        return jsonify({"error": f"Höchstens {IMPORT_MAX_ROWS} Zeilen pro Import"}), 400
+
+    today_str = datetime.now().strftime('%Y-%m-%d')
+    rows, errors = [], []
+    for i, raw in enumerate(raw_rows, start=1):
+        row, error = _validate_import_row(raw, today_str)
+        if error:
+            errors.append({'row': i, 'status': 'error', 'error': error})
+        else:
+            rows.append(row)
+    if errors:
+        return jsonify({"created": 0, "duplicates": 0, "errors": len(errors), "results": errors}), 400
+
+    try:
+        with get_db_connection() as conn:
+            results = import_exams(conn, rows)
+    except Exception as e:
+        print("❌ Import error:", e)
+        return jsonify({"error": str(e)}), 500
+    created = sum(1 for r in results if r['status'] == 'created')
+    return jsonify({
+        "created": created,
+        "duplicates": len(results) - created,
+        "errors": 0,
+        "results": results,
+    })
+
+# -------------------- iCalendar yardımcıları --------------------
+# RFC 5545: satırlar CRLF ile biter, 75 oktetten uzun satırlar katlanır
+# (devam satırı tek boşlukla başlar), metin değerlerinde \ ; , ve satır sonu kaçırılır.
+ICS_PRODID = "-//Prufungskalender//DE"
+ICS_TZID = "Europe/Berlin"
+ICS_VTIMEZONE = (
+    "BEGIN:VTIMEZONE\r\n"
+    "TZID:Europe/Berlin\r\n"
+    "BEGIN:DAYLIGHT\r\n"
+    "TZOFFSETFROM:+0100\r\nTZOFFSETTO:+0200\r\nTZNAME:CEST\r\n"
+    "DTSTART:19700329T020000\r\nRRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU\r\n"
+    "END:DAYLIGHT\r\n"
+    "BEGIN:STANDARD\r\n"
+    "TZOFFSETFROM:+0200\r\nTZOFFSETTO:+0100\r\nTZNAME:CET\r\n"
+    "DTSTART:19701025T030000\r\nRRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU\r\n"
+    "END:STANDARD\r\n"
+    "END:VTIMEZONE\r\n"
+)
+
+def ics_escape(text) -> str:
+    return (str(text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def ics_fold(line: str) -> str:
+    """Tek içerik satırını 75 oktetlik parçalara katlar (UTF-8 karakterleri bölünmez)."""
+    if len(line.encode('utf-8')) <= 75:
+        return line + "\r\n"
+    parts, current, size, limit = [], [], 0, 75
+    for ch in line:
+        n = len(ch.encode('utf-8'))
+        if size + n > limit:
+            parts.append(''.join(current))
+            current, size, limit = [], 0, 74  # devam satırlarında baştaki boşluk da sayılır
+        current.append(ch)
+        size += n
+    parts.append(''.join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+def ics_calendar_start(name: str) -> str:
+    return (
+        "BEGIN:VCALENDAR\r\n"
+        "VERSION:2.0\r\n"
+        f"PRODID:{ICS_PRODID}\r\n"
+        "CALSCALE:GREGORIAN\r\n"
+        "METHOD:PUBLISH\r\n"
+        + ics_fold(f"X-WR-CALNAME:{ics_escape(name)}")
+        + f"X-WR-TIMEZONE:{ICS_TZID}\r\n"
+        + ICS_VTIMEZONE
+    )
+
+ICS_CALENDAR_END = "END:VCALENDAR\r\n"
+
+def ics_exam_event(exam_id, date_str, grade, subject, start_time, end_time, dtstamp) -> str:
+    d = date_str.replace('-', '')
+    return (
+        "BEGIN:VEVENT\r\n"
+        f"UID:exam-{exam_id}@prufungskalender\r\n"
+        f"DTSTAMP:{dtstamp}\r\n"
+        f"DTSTART;TZID={ICS_TZID}:{d}T{start_time.replace(':', '')}00\r\n"
+        f"DTEND;TZID={ICS_TZID}:{d}T{end_time.replace(':', '')}00\r\n"
+        + ics_fold(f"SUMMARY:{ics_escape(subject)} ({ics_escape(grade)})")
+        + "CATEGORIES:Prüfung\r\n"
+        "END:VEVENT\r\n"
+    )
+
+# -------------------- CSV / ICS dışa aktarma --------------------
+# GET /export.csv ve /export.ics (?grade=&subject=&from=&to=). Satırlar cursor'dan
+# fetchmany ile okunup parça parça (chunked) gönderilir; bellek tablo boyutundan
+# bağımsızdır. ETag veri sürümüne bağlıdır: değişiklik yoksa 304, sorgu bile çalışmaz.
+EXPORT_FETCH_SIZE = 500
+EXPORT_COLUMNS = ('date', 'start_time', 'end_time', 'grade', 'subject')
+
+def _export_etag(kind: str, filters: dict) -> str:
+    raw = f"{kind}|{sorted(filters.items())}|{data_version('calendar')}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _iter_export_rows(filters, fields):
+    """(date, id, *fields) satırlarını fetchmany partileri hâlinde üretir."""
+    sql, params = build_exams_query(fields, limit=-1, **filters)
+    sent = 0
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = None
+        cur.execute(sql, params)
+        try:
+            while True:
+                rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                sent += len(rows)
+                yield rows
+        finally:
+            count_rows('export_exams', sent)
+
+def _iter_export_csv(filters):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\r\n')
+    writer.writerow(EXPORT_COLUMNS)
+    yield buf.getvalue()
+    for rows in _iter_export_rows(filters, EXPORT_COLUMNS):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(r[2:] for r in rows)
+        yield buf.getvalue()
+
+def _iter_export_ics(filters):
+    yield ics_calendar_start("Prüfungskalender")
+    dtstamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    for rows in _iter_export_rows(filters, ('grade', 'subject', 'start_time', 'end_time')):
+        yield "".join(
+            ics_exam_event(exam_id, d, grade, subject, start, end, dtstamp)
+            for d, exam_id, grade, subject, start, end in rows
+        )
+    yield ICS_CALENDAR_END
+
+def _export_response(kind, generate, mimetype, filename):
+    try:
+        filters = parse_exam_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    etag = _export_etag(kind, filters)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(stream_with_context(generate(filters)), mimetype=mimetype)
+        resp.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+@app.route('/export.csv')
+def export_csv():
+    return _export_response('csv', _iter_export_csv, 'text/csv', 'pruefungen.csv')
+
+@app.route('/export.ics')
+def export_ics():
+    return _export_response('ics', _iter_export_ics, 'text/calendar', 'pruefungen.ics')
+
+# -------------------- /calendar.ics abonelik beslemesi --------------------
+# Telefon takvimleri (webcal://.../calendar.ics?grade=4A) bu beslemeyi birkaç
+# dakikada bir yoklar. Gövde (grade, veri sürümü, tatil nesli, gün) anahtarıyla
+# bir kez üretilip saklanır; her yazımdan sonraki ilk istek yeniden üretir,
+# ardından gelen tüm yoklamalar ETag/Last-Modified ile 304 alır.
+CALENDAR_FEED_PAST_DAYS = int(os.getenv("CALENDAR_FEED_PAST_DAYS", "180"))
+CALENDAR_FEED_MAX_ENTRIES = 64
+# ETag içerikten hesaplanır; DTSTAMP ise hash'ten sonra yerleştirilir ki
+# içerik değişmeden yeniden üretilen gövde (ya da başka worker) aynı ETag'i versin.
+_FEED_DTSTAMP = "\x00DTSTAMP\x00"
+
+_calendar_feed_cache = OrderedDict()
+_calendar_feed_lock = threading.Lock()
+
+def _ics_all_day_event(uid, start_str, end_ex_str, summary, transparent=False) -> str:
+    return (
+        "BEGIN:VEVENT\r\n"
+        f"UID:{uid}@prufungskalender\r\n"
+        f"DTSTAMP:{_FEED_DTSTAMP}\r\n"
+        f"DTSTART;VALUE=DATE:{start_str.replace('-', '')}\r\n"
+        f"DTEND;VALUE=DATE:{end_ex_str.replace('-', '')}\r\n"
+        + ics_fold(f"SUMMARY:{ics_escape(summary)}")
+        + ("TRANSP:TRANSPARENT\r\n" if transparent else "")
+        + "END:VEVENT\r\n"
+    )
+
+def render_calendar_feed(grade=None) -> str:
+    """Sınavlar + Obst + okul tatilleri (hafta içi blokları) için VCALENDAR gövdesi."""
+    today = datetime.now().date()
+    since = (today - timedelta(days=CALENDAR_FEED_PAST_DAYS)).isoformat()
+    parts = [ics_calendar_start(f"Prüfungskalender {grade}" if grade else "Prüfungskalender")]
+    sql, params = build_exams_query(('grade', 'subject', 'start_time', 'end_time'),
+                                    grade=grade, date_from=since, limit=-1)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = None
+        n = len(parts)
+        for d, exam_id, exam_grade, subject, start, end in cur.execute(sql, params):
+            parts.append(ics_exam_event(exam_id, d, exam_grade, subject, start, end, _FEED_DTSTAMP))
+        count_rows('calendar_exams', len(parts) - n)
+        n = len(parts)
+        for obst_id, d, parent_name in cur.execute(CALENDAR_OBST_SQL, (since,)):
+            next_day = (datetime.strptime(d, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            parts.append(_ics_all_day_event(f"obst-{obst_id}", d, next_day, f"Obst: {parent_name or ''}"))
+        count_rows('calendar_obst', len(parts) - n)
+    try:
+        holidays = holiday_background_events({today.year, today.year + 1})
+    except Exception as e:
+        print(f"Tatil indeksi hatası: {e}")
+        holidays = []
+    for ev in holidays:
+        if ev['end'] > since:
+            parts.append(_ics_all_day_event(f"frei-{ev['start']}-{ev['end']}", ev['start'], ev['end'],
+                                            "Schulfrei", transparent=True))
+    parts.append(ICS_CALENDAR_END)
+    return "".join(parts)
+
+def get_calendar_feed(grade=None) -> dict:
+    """Önbellekteki besleme kaydı ({'body','etag','last_modified'}); gerekirse yeniden üretir."""
+    # Sınıf filtresi NOCASE; gövde (takvim adı) da aynı olsun diye büyük harfe çevrilir
+    grade = grade.upper() if grade else None
+    cache_key = grade or ''
+    version = (data_version('calendar'), _holiday_generation, datetime.now().strftime('%Y-%m-%d'))
+    now = time.time()
+    with _calendar_feed_lock:
+        entry = _calendar_feed_cache.get(cache_key)
+    if entry and entry['version'] == version and now < entry['expires_at']:
+        return entry
+    template = render_calendar_feed(grade)
+    etag = hashlib.sha1(template.encode('utf-8')).hexdigest()
+    if entry and entry['etag'] == etag:
+        # İçerik aynı: gövde ve Last-Modified korunur, istemciler 304 almaya devam eder
+        entry = dict(entry, version=version, expires_at=now + EVENTS_CACHE_TTL_SECONDS)
+    else:
+        modified = datetime.now(timezone.utc).replace(microsecond=0)
+        body = template.replace(_FEED_DTSTAMP, modified.strftime('%Y%m%dT%H%M%SZ')).encode('utf-8')
+        entry = {
+            'version': version,
+            'body': body,
+            'etag': etag,
+            'last_modified': modified,
+            'expires_at': now + EVENTS_CACHE_TTL_SECONDS,
+        }
+    with _calendar_feed_lock:
+        _calendar_feed_cache[cache_key] = entry
+        _calendar_feed_cache.move_to_end(cache_key)
+        while len(_calendar_feed_cache) > CALENDAR_FEED_MAX_ENTRIES:
+            _calendar_feed_cache.popitem(last=False)
+    return entry
+
+@app.route('/calendar.ics')
+def calendar_feed():
+    grade = (request.args.get('grade') or '').strip()
+    if len(grade) > 16:
+        return jsonify({"error": "grade zu lang"}), 400
+    try:
+        entry = get_calendar_feed(grade or None)
+    except Exception as e:
+        print(f"❌ Calendar feed error: {e}")
+        return "Fehler beim Erstellen des Kalenders", 500
+    resp = app.response_class(entry['body'], mimetype='text/calendar')
+    resp.set_etag(entry['etag'])
+    resp.last_modified = entry['last_modified']
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['Content-Disposition'] = 'inline; filename="pruefungskalender.ics"'
+    return resp.make_conditional(request)
+
 @app.route("/stats", methods=["GET"])
+@login_required
 def stats():
     """İstatistikler (şifresiz)"""
     # Ek güvenlik: dekoratöre ek olarak içerden de kontrol et
     if not session.get('stats_authed'):
         return redirect(url_for('stats_login'))
-    def get_admin():
-        with get_db_connection() as conn:
-            row = conn.execute("SELECT username, password_hash FROM admin_credentials LIMIT 1").fetchone()
-        return (row['username'], row['password_hash']) if row else (None, None)
-    def generate_token(pwd_hash):
-        return hashlib.sha256(f"{pwd_hash}:prufungskalender".encode()).hexdigest()
-
-    # Login denemesi
-    if request.method == "POST" and request.form.get('login_attempt') == '1':
-        in_user = (request.form.get('username') or '').strip()
-        in_pass = (request.form.get('password') or '').strip()
-        admin_user, admin_hash = get_admin()
-        # Kullanıcı adı eşleşmesini büyük/küçük harf duyarsız yap
-        user_match = (admin_user or '').strip().lower() == in_user.lower()
-        pass_ok = bool(admin_hash) and check_password_hash(admin_hash, in_pass)
-        if admin_user and user_match and pass_ok:
-            token = generate_token(admin_hash)
-            resp = redirect(url_for('stats'))
-            resp.set_cookie('stats_auth', token, max_age=86400, httponly=True)
-            return resp
-        # Hatalı giriş
-        return """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <link href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/bootstrap-icons.css" rel="stylesheet">
-                # Eski login formu POST'ları gelirse paneli göster
-                <style>
-                    return redirect(url_for('stats'))
-                    padding-bottom: 120px; /* floating butonlar için boşluk */
-                }
-                .container {
-                    width: 100%;
-                    display: flex;
-                    justify-content: center;
-                    align-items: center;
-                    min-height: 100vh;
-                }
-                @keyframes fadeInUp {
-                    from { opacity: 0; transform: translateY(30px); }
-                    to { opacity: 1; transform: translateY(0); }
-                }
-                .login-box { 
-                    background: rgba(255, 255, 255, 0.95); 
-                    padding: 50px 40px; 
-                    border-radius: 20px; 
-                    box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-                    animation: fadeInUp 0.6s ease-out;
-                    backdrop-filter: blur(10px);
-                    min-width: 350px;
-                    max-width: 400px;
-                    width: 100%;
-                    transition: transform 0.3s ease;
-                }
-                .login-box.keyboard-open {
-                    transform: translateY(-80px);
-                }
-                @media (max-width: 600px) {
-                    .login-box {
-                        min-width: unset;
-                        padding: 40px 30px;
-                    }
-                }
-                h2 { 
-                    text-align: center; 
-                    color: #333; 
-                    margin-bottom: 30px;
-                    font-size: 1.8em;
-                }
-                .input-group {
-                    position: relative;
-                    margin-bottom: 25px;
-                }
-                input { 
-                    padding: 14px 45px 14px 14px; 
-                    font-size: 16px; 
-                    border: 2px solid #e0e0e0; 
-                    border-radius: 10px; 
-                    width: 100%;
-                    transition: all 0.3s ease;
-                    background: white;
-                }
-                input:focus {
-                    outline: none;
-                    border-color: #667eea;
-                    box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-                }
-                /* Edge/IE varsayılan şifre gözünü gizle */
-                input[type="password"]::-ms-reveal,
-                input[type="password"]::-ms-clear { display: none; }
-                .toggle-password {
-                    position: absolute;
-                    right: 12px;
-                    top: 50%;
-                    transform: translateY(-50%);
-                    background: none;
-                    border: none;
-                    cursor: pointer;
-                    font-size: 20px;
-                    padding: 5px;
-                    color: #666;
-                    transition: color 0.3s;
-                }
-                .toggle-password:hover { color: #667eea; }
-                button.submit-btn { 
-                    padding: 14px 24px; 
-                    font-size: 16px; 
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white; 
-                    border: none; 
-                    border-radius: 10px; 
-                    cursor: pointer; 
-                    width: 100%;
-                    font-weight: 600;
-                    transition: transform 0.2s, box-shadow 0.3s;
-                    position: relative;
-                }
-                button.submit-btn:hover { 
-                    transform: translateY(-2px);
-                    box-shadow: 0 10px 25px rgba(102, 126, 234, 0.4);
-                }
-                button.submit-btn:active {
-                    transform: translateY(0);
-                }
-                @keyframes spin {
-                    to { transform: rotate(360deg); }
-                }
-                .spinner {
-                    display: none;
-                    width: 20px;
-                    height: 20px;
-                    border: 3px solid rgba(255,255,255,0.3);
-                    border-top-color: white;
-                    border-radius: 50%;
-                    animation: spin 0.8s linear infinite;
-                    position: absolute;
-                    left: 50%;
-                    top: 50%;
-                    transform: translate(-50%, -50%);
-                }
-                .loading .spinner { display: block; }
-                .loading .btn-text { opacity: 0; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="login-box" id="loginBox">
-                    <h2>🔒 Stats</h2>
-                    <form method="get" id="loginForm">
-                                                <div class="input-group">
-                                                        <input type="password" name="p" id="password" placeholder="Passwort" autofocus required>
-                                                        <span class="toggle-password" aria-hidden="true">
-                                                                <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="currentColor" viewBox="0 0 16 16">
-                                                                    <path d="M16 8s-3-5.5-8-5.5S0 8 0 8s3 5.5 8 5.5S16 8 16 8M1.173 8a13 13 0 0 1 1.66-2.043C4.12 4.668 5.88 3.5 8 3.5s3.879 1.168 5.168 2.457A13 13 0 0 1 14.828 8q-.086.13-.195.288c-.335.48-.83 1.12-1.465 1.755C11.879 11.332 10.119 12.5 8 12.5s-3.879-1.168-5.168-2.457A13 13 0 0 1 1.172 8z"/>
-                                                                    <path d="M8 5.5a2.5 2.5 0 1 0 0 5 2.5 2.5 0 0 0 0-5M4.5 8a3.5 3.5 0 1 1 7 0 3.5 3.5 0 0 1-7 0"/>
-                                                                </svg>
-                                                        </span>
-                                                </div>
-                        <button type="submit" class="submit-btn" id="submitBtn">
-                            <span class="btn-text">Anmelden</span>
-                            <div class="spinner"></div>
-                        </button>
-                    </form>
-                </div>
-            </div>
-            <script>
-                // Basit göz togglesı: şifre görünür/gizli durumunu değiştirir.
-                (function(){
-                    const btn = document.querySelector('.toggle-password');
-                    const input = document.getElementById('password');
-                    if (!btn || !input) return;
-                    const EYE = '<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="currentColor" viewBox="0 0 16 16"><path d="M16 8s-3-5.5-8-5.5S0 8 0 8s3 5.5 8 5.5S16 8 16 8M1.173 8a13 13 0 0 1 1.66-2.043C4.12 4.668 5.88 3.5 8 3.5s3.879 1.168 5.168 2.457A13 13 0 0 1 14.828 8q-.086.13-.195.288c-.335.48-.83 1.12-1.465 1.755C11.879 11.332 10.119 12.5 8 12.5s-3.879-1.168-5.168-2.457A13 13 0 0 1 1.172 8z"/><path d="M8 5.5a2.5 2.5 0 1 0 0 5 2.5 2.5 0 0 0 0-5M4.5 8a3.5 3.5 0 1 1 7 0 3.5 3.5 0 0 1-7 0"/></svg>';
-                    const EYE_SLASH = '<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="currentColor" viewBox="0 0 16 16"><path d="M13.359 11.238C15.06 9.72 16 8 16 8s-3-5.5-8-5.5a7 7 0 0 0-2.79.588l.77.771A6 6 0 0 1 8 3.5c2.12 0 3.879 1.168 5.168 2.457A13 13 0 0 1 14.828 8q-.086.13-.195.288c-.335.48-.83 1.12-1.465 1.755q-.247.248-.517.486z"/><path d="M11.297 9.176a3.5 3.5 0 0 0-4.474-4.474l.823.823a2.5 2.5 0 0 1 2.829 2.829zm-2.943 1.299.822.822a3.5 3.5 0 0 1-4.474-4.474l.823.823a2.5 2.5 0 0 0 2.829 2.829"/><path d="M3.35 5.47q-.27.24-.518.487A13 13 0 0 0 1.172 8l.195.288c.335.48.83 1.12 1.465 1.755C4.121 11.332 5.881 12.5 8 12.5c.716 0 1.39-.133 2.02-.36l.77.772A7 7 0 0 1 8 13.5C3 13.5 0 8 0 8s.939-1.721 2.641-3.238l.708.709zm10.296 8.884-12-12 .708-.708 12 12z"/></svg>';
-                    btn.style.cursor = 'pointer';
-                    // İlk durumu simgele: şifre gizliyse eye-slash
-                    btn.innerHTML = input.type === 'password' ? EYE_SLASH : EYE;
-                    btn.addEventListener('click', function(){
-                        const show = input.type === 'password';
-                        input.type = show ? 'text' : 'password';
-                        btn.innerHTML = show ? EYE : EYE_SLASH;
-                    });
-                })();
-                
-                // Mobil klavye açıldığında login kutusunu yukarı kaydır
-                const loginBox = document.getElementById('loginBox');
-                const passwordInput = document.getElementById('password');
-                
-                passwordInput.addEventListener('focus', function() {
-                    // iOS ve Android için klavye tespit et
-                    setTimeout(function() {
-                        loginBox.classList.add('keyboard-open');
-                        // Scroll to input için ekstra
-                        passwordInput.scrollIntoView({ behavior: 'smooth', block: 'center' });
-                    }, 300);
-                });
-                
-                passwordInput.addEventListener('blur', function() {
-                    loginBox.classList.remove('keyboard-open');
-                });
-                
-                document.getElementById('loginForm').addEventListener('submit', function() {
-                    document.getElementById('submitBtn').classList.add('loading');
-                });
-                // İlk klavye açılışında bile kutuyu yukarı kaydırma iyileştirmesi
-                (function initKeyboardAssist(){
-                    const isMobile = /Android|iPhone|iPad|iPod/i.test(navigator.userAgent);
-                    if (!isMobile) return; // Masaüstünde gerek yok
-                    let elevated = false;
-                    function elevate(){
-                        if (!elevated){
-                            loginBox.classList.add('keyboard-open');
-                            elevated = true;
-                        }
-                        setTimeout(()=>passwordInput.scrollIntoView({behavior:'smooth', block:'center'}),50);
-                    }
-                    passwordInput.addEventListener('focus', elevate, { once: false });
-                    passwordInput.addEventListener('touchstart', elevate, { once: false });
-                    if (window.visualViewport){
-                        const initialVH = window.visualViewport.height;
-                        window.visualViewport.addEventListener('resize', ()=>{
-                            // Klavye açıldığında yükseklik küçülür
-                            if (window.visualViewport.height < initialVH - 100){
-                                elevate();
-                            }
-                        });
-                    }
-                })();
-            </script>
-        </body>
-        </html>
-        """, 401
-    
-
-    # Cookie kontrolü (artık devre dışı)
-    admin_user, admin_hash = get_admin()
-    token = request.cookies.get('stats_auth')
-    expected = generate_token(admin_hash) if admin_hash else None
-    if False and token != expected:
-        return """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Login</title>
-            <style>
-                * { margin: 0; padding: 0; box-sizing: border-box; }
-                body { 
-                    font-family: system-ui, -apple-system, sans-serif; 
-                    display: flex; 
-                    justify-content: center; 
-                    align-items: center; 
-                    min-height: 100vh; 
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    overflow: auto;
-                    padding: 20px;
-                    padding-bottom: 120px; /* floating butonlar için boşluk */
-                }
-                .container {
-                    width: 100%;
-                    display: flex;
-                    justify-content: center;
-                    align-items: center;
-                    min-height: 100vh;
-                }
-                @keyframes fadeInUp {
-                    from { opacity: 0; transform: translateY(30px); }
-                    to { opacity: 1; transform: translateY(0); }
-                }
-                .login-box { 
-                    background: rgba(255, 255, 255, 0.95); 
-                    padding: 50px 40px; 
-                    border-radius: 20px; 
-                    box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-                    animation: fadeInUp 0.6s ease-out;
-                    backdrop-filter: blur(10px);
-                    min-width: 350px;
-                    max-width: 400px;
-                    width: 100%;
-                    transition: transform 0.3s ease;
-                }
-                .login-box.keyboard-open {
-                    transform: translateY(-80px);
-                }
-                @media (max-width: 600px) {
-                    .login-box {
-                        min-width: unset;
-                        padding: 40px 30px;
-                    }
-                }
-                h2 { 
-                    text-align: center; 
-                    color: #333; 
-                    margin-bottom: 30px;
-                    font-size: 1.8em;
-                }
-                .input-group {
-                    position: relative;
-                    margin-bottom: 25px;
-                }
-                input { 
-                    padding: 14px 45px 14px 14px; 
-                    font-size: 16px; 
-                    border: 2px solid #e0e0e0; 
-                    border-radius: 10px; 
-                    width: 100%;
-                    transition: all 0.3s ease;
-                    background: white;
-                }
-                input:focus {
-                    outline: none;
-                    border-color: #667eea;
-                    box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-                }
-                /* Edge/IE varsayılan şifre gözünü gizle */
-                input[type="password"]::-ms-reveal,
-                input[type="password"]::-ms-clear { display: none; }
-                .toggle-password {
-                    position: absolute;
-                    right: 12px;
-                    top: 50%;
-                    transform: translateY(-50%);
-                    background: none;
-                    border: none;
-                    cursor: pointer;
-                    font-size: 20px;
-                    padding: 5px;
-                    color: #666;
-                    transition: color 0.3s;
-                }
-                .toggle-password:hover { color: #667eea; }
-                button.submit-btn { 
-                    padding: 14px 24px; 
-                    font-size: 16px; 
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white; 
-                    border: none; 
-                    border-radius: 10px; 
-                    cursor: pointer; 
-                    width: 100%;
-                    font-weight: 600;
-                    transition: transform 0.2s, box-shadow 0.3s;
-                    position: relative;
-                }
-                button.submit-btn:hover { 
-                    transform: translateY(-2px);
-                    box-shadow: 0 10px 25px rgba(102, 126, 234, 0.4);
-                }
-                button.submit-btn:active {
-                    transform: translateY(0);
-                }
-                @keyframes spin {
-                    to { transform: rotate(360deg); }
-                }
-                .spinner {
-                    display: none;
-                    width: 20px;
-                    height: 20px;
-                    border: 3px solid rgba(255,255,255,0.3);
-                    border-top-color: white;
-                    border-radius: 50%;
-                    animation: spin 0.8s linear infinite;
-                    position: absolute;
-                    left: 50%;
-                    top: 50%;
-                    transform: translate(-50%, -50%);
-                }
-                .loading .spinner { display: block; }
-                .loading .btn-text { opacity: 0; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="login-box" id="loginBox">
-                    <h2>🔒 Stats</h2>
-                    <form method="post" id="loginForm">
-                        <input type="hidden" name="login_attempt" value="1" />
-                        <div class="input-group">
-                            <input type="text" name="username" id="username" placeholder="Benutzername" required autocomplete="username">
-                        </div>
-                                                <div class="input-group">
-                                                        <input type="password" name="password" id="password" placeholder="Passwort" required autocomplete="current-password">
-                                                        <span class="toggle-password" aria-hidden="true">
-                                                                <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="currentColor" viewBox="0 0 16 16">
-                                                                    <path d="M16 8s-3-5.5-8-5.5S0 8 0 8s3 5.5 8 5.5S16 8 16 8M1.173 8a13 13 0 0 1 1.66-2.043C4.12 4.668 5.88 3.5 8 3.5s3.879 1.168 5.168 2.457A13 13 0 0 1 14.828 8q-.086.13-.195.288c-.335.48-.83 1.12-1.465 1.755C11.879 11.332 10.119 12.5 8 12.5s-3.879-1.168-5.168-2.457A13 13 0 0 1 1.172 8z"/>
-                                                                    <path d="M8 5.5a2.5 2.5 0 1 0 0 5 2.5 2.5 0 0 0 0-5M4.5 8a3.5 3.5 0 1 1 7 0 3.5 3.5 0 0 1-7 0"/>
-                                                                </svg>
-                                                        </span>
-                                                </div>
-                        <button type="submit" class="submit-btn" id="submitBtn">
-                            <span class="btn-text">Anmelden</span>
-                            <div class="spinner"></div>
-                        </button>
-                    </form>
-                    <button class="change-toggle" id="changeToggle" style="margin-top:18px;background:none;border:none;color:#667eea;cursor:pointer;font-weight:600">Zugangsdaten ändern ▾</button>
-                    <div id="changePanel" style="display:none;margin-top:15px;animation:fadeInUp 0.4s ease-out">
-                        <form method="post" action="/stats/update-credentials" id="changeForm">
-                            <div class="input-group">
-                                <input type="password" name="current_password" placeholder="Aktuelles Passwort" required autocomplete="current-password">
-                            </div>
-                            <div class="input-group">
-                                <input type="text" name="new_username" placeholder="Neuer Benutzername (optional)" autocomplete="username">
-                            </div>
-                            <div class="input-group">
-                                <input type="password" name="new_password" placeholder="Neues Passwort (optional)" autocomplete="new-password">
-                            </div>
-                            <div class="input-group">
-                                <input type="password" name="new_password_repeat" placeholder="Neues Passwort wiederholen" autocomplete="new-password">
-                            </div>
-                            <button type="submit" class="submit-btn" style="margin-top:5px">
-                                <span class="btn-text">Speichern</span>
-                                <div class="spinner"></div>
-                            </button>
-                            <div style="font-size:0.75em;color:#666;margin-top:6px">Mindestens 8 Zeichen, Buchstaben + Zahlen empfohlen.</div>
-                        </form>
-                    </div>
-                </div>
-            </div>
-            <script>
-                // Basit göz togglesı: şifre görünür/gizli durumunu değiştirir.
-                (function(){
-                    const btn = document.querySelector('.toggle-password');
-                    const input = document.getElementById('password');
-                    if (!btn || !input) return;
-                    const EYE = '<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="currentColor" viewBox="0 0 16 16"><path d="M16 8s-3-5.5-8-5.5S0 8 0 8s3 5.5 8 5.5S16 8 16 8M1.173 8a13 13 0 0 1 1.66-2.043C4.12 4.668 5.88 3.5 8 3.5s3.879 1.168 5.168 2.457A13 13 0 0 1 14.828 8q-.086.13-.195.288c-.335.48-.83 1.12-1.465 1.755C11.879 11.332 10.119 12.5 8 12.5s-3.879-1.168-5.168-2.457A13 13 0 0 1 1.172 8z"/><path d="M8 5.5a2.5 2.5 0 1 0 0 5 2.5 2.5 0 0 0 0-5M4.5 8a3.5 3.5 0 1 1 7 0 3.5 3.5 0 0 1-7 0"/></svg>';
-                    const EYE_SLASH = '<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="currentColor" viewBox="0 0 16 16"><path d="M13.359 11.238C15.06 9.72 16 8 16 8s-3-5.5-8-5.5a7 7 0 0 0-2.79.588l.77.771A6 6 0 0 1 8 3.5c2.12 0 3.879 1.168 5.168 2.457A13 13 0 0 1 14.828 8q-.086.13-.195.288c-.335.48-.83 1.12-1.465 1.755q-.247.248-.517.486z"/><path d="M11.297 9.176a3.5 3.5 0 0 0-4.474-4.474l.823.823a2.5 2.5 0 0 1 2.829 2.829zm-2.943 1.299.822.822a3.5 3.5 0 0 1-4.474-4.474l.823.823a2.5 2.5 0 0 0 2.829 2.829"/><path d="M3.35 5.47q-.27.24-.518.487A13 13 0 0 0 1.172 8l.195.288c.335.48.83 1.12 1.465 1.755C4.121 11.332 5.881 12.5 8 12.5c.716 0 1.39-.133 2.02-.36l.77.772A7 7 0 0 1 8 13.5C3 13.5 0 8 0 8s.939-1.721 2.641-3.238l.708.709zm10.296 8.884-12-12 .708-.708 12 12z"/></svg>';
-                    btn.style.cursor = 'pointer';
-                    // İlk durumu simgele: şifre gizliyse eye-slash
-                    btn.innerHTML = input.type === 'password' ? EYE_SLASH : EYE;
-                    btn.addEventListener('click', function(){
-                        const show = input.type === 'password';
-                        input.type = show ? 'text' : 'password';
-                        btn.innerHTML = show ? EYE : EYE_SLASH;
-                    });
-                })();
-                
-                const loginBox = document.getElementById('loginBox');
-                const passwordInput = document.getElementById('password');
-                
-                let userInteracted = false;
-                ['touchstart','mousedown','click'].forEach(ev => {
-                    window.addEventListener(ev, () => { userInteracted = true; }, { once: true });
-                });
-                passwordInput.addEventListener('focus', function() {
-                    if (!userInteracted) return;
-                    setTimeout(function() {
-                        loginBox.classList.add('keyboard-open');
-                        passwordInput.scrollIntoView({ behavior: 'smooth', block: 'center' });
-                    }, 50);
-                });
-                
-                passwordInput.addEventListener('blur', function() {
-                    loginBox.classList.remove('keyboard-open');
-                });
-                
-                document.getElementById('loginForm').addEventListener('submit', function() {
-                    document.getElementById('submitBtn').classList.add('loading');
-                });
-                const changeToggle = document.getElementById('changeToggle');
-                const changePanel = document.getElementById('changePanel');
-                changeToggle.addEventListener('click', ()=>{
-                    const open = changePanel.style.display === 'block';
-                    changePanel.style.display = open ? 'none' : 'block';
-                    changeToggle.textContent = open ? 'Bilgileri Değiştir ▾' : 'Bilgileri Gizle ▴';
-                });
-            </script>
-        </body>
-        </html>
-        """, 401
-    
     # Authenticated - Stats sayfasını göster
     try:
         with get_db_connection() as conn:
-            # Sınav istatistikleri
-            total_exams = conn.execute("SELECT COUNT(*) FROM exams").fetchone()[0]
-            upcoming_exams = conn.execute("SELECT COUNT(*) FROM exams WHERE date >= date('now')").fetchone()[0]
-            past_exams = conn.execute("SELECT COUNT(*) FROM exams WHERE date < date('now')").fetchone()[0]
-            this_month_exams = conn.execute("""
-                SELECT COUNT(*) FROM exams 
-                WHERE strftime('%Y-%m', date) = strftime('%Y-%m', 'now')
-            """).fetchone()[0]
-            
-            # Ders listesi (yönetim) - varsayılan + DB birleşik gösterim
-            sub_rows = conn.execute("SELECT id, name FROM subjects ORDER BY name COLLATE NOCASE").fetchall()
-            default_pool = ['Mathematik','Deutsch','HSU','Englisch','Ethik','Religion','Musik']
-            db_map = { (r['name'] or '').strip().lower(): r['id'] for r in sub_rows }
-            merged_names = []
-            seen = set()
-            for nm in (default_pool + [r['name'] for r in sub_rows]):
-                if not nm:
-                    continue
-                key = nm.strip()
-                if not key:
-                    continue
-                lk = key.lower()
-                if lk not in seen:
-                    seen.add(lk)
-                    merged_names.append(key)
-            merged_names.sort(key=lambda s: s.lower())
-            # HTML-Elemente für die Stats-Liste vorbereiten
-            items_html_parts = []
-            for name in merged_names:
-                key_l = (name or '').strip().lower()
-                sid = db_map.get(key_l)
-                if sid is not None:
-                    items_html_parts.append(
-                        f"<li style='display:flex;align-items:center;justify-content:space-between;padding:12px 14px;border:1px solid var(--border-color);border-radius:10px;margin:8px 0;background:linear-gradient(135deg, var(--bg-lighter), rgba(102, 126, 234, 0.02));transition:all 0.2s ease;'>"
-                        f"<span style='font-weight:600;color:var(--text-secondary)'>{name}</span>"
-                        f"<form method='post' action='/stats/subjects/delete' style='margin:0'>"
-                        f"<input type='hidden' name='subject_id' value='{sid}'/>"
-                        f"<button type='submit' style='background:linear-gradient(135deg, #dc3545, #c82333);color:#fff;border:none;padding:8px 12px;border-radius:8px;cursor:pointer;font-weight:600;transition:all 0.2s ease;box-shadow:0 2px 4px rgba(220, 53, 69, 0.2)' onmouseover=\"this.style.boxShadow='0 4px 12px rgba(220, 53, 69, 0.35)';this.style.transform='translateY(-2px)'\" onmouseout=\"this.style.boxShadow='0 2px 4px rgba(220, 53, 69, 0.2)';this.style.transform='translateY(0)'\">Löschen</button>"
-                        f"</form>"
-                        f"</li>"
-                    )
-                else:
-                    items_html_parts.append(
-                        f"<li style='display:flex;align-items:center;justify-content:space-between;padding:12px 14px;border:1px solid var(--border-color);border-radius:10px;margin:8px 0;background:linear-gradient(135deg, var(--bg-lighter), rgba(102, 126, 234, 0.02));'>"
-                        f"<span style='font-weight:600;color:var(--text-secondary)'>{name}</span>"
-                        f"<span class='small' style='color:var(--text-muted);background:linear-gradient(135deg, rgba(102, 126, 234, 0.1), rgba(118, 75, 162, 0.1));border:1px solid rgba(102, 126, 234, 0.2);border-radius:8px;padding:6px 10px;font-weight:600'>Standard</span>"
-                        f"</li>"
-                    )
-            items_html = "".join(items_html_parts)
+            # Sınav istatistikleri (tek sorgu)
+            exam_stats = compute_exam_stats(conn)
 
             # Obst planları (stats sayfasından silme)
             try:
-                obst_rows = conn.execute(
-                    "SELECT id, date, parent_name FROM obst_schedule ORDER BY date ASC LIMIT 80"
-                ).fetchall()
+                obst_entries = conn.execute(OBST_LIST_SQL).fetchall()
+                count_rows('stats_obst_list', len(obst_entries))
             except Exception:
-                obst_rows = []
-
-            obst_items_parts = []
-            for r in obst_rows:
-                try:
-                    display_date = _jinja2_filter_datetime(r['date'], '%d.%m.%Y')
-                except Exception:
-                    display_date = r['date']
-                obst_items_parts.append(
-                    "<tr>"
-                    f"<td><strong>{display_date}</strong></td>"
-                    f"<td>{(r['parent_name'] or '')}</td>"
-                    "<td style='text-align:right'>"
-                    "<form method='post' action='/stats/obst/delete' style='margin:0;display:inline'>"
-                    f"<input type='hidden' name='obst_id' value='{r['id']}'/>"
-                    "<button type='submit' style='background:linear-gradient(135deg, #dc3545, #c82333);color:#fff;border:none;padding:8px 12px;border-radius:8px;cursor:pointer;font-weight:700;transition:all 0.2s ease;box-shadow:0 2px 4px rgba(220, 53, 69, 0.2)' onmouseover=\"this.style.boxShadow='0 4px 12px rgba(220, 53, 69, 0.35)';this.style.transform='translateY(-2px)'\" onmouseout=\"this.style.boxShadow='0 2px 4px rgba(220, 53, 69, 0.2)';this.style.transform='translateY(0)'\">Löschen</button>"
-                    "</form>"
-                    "</td>"
-                    "</tr>"
-                )
-            obst_table_html = "".join(obst_items_parts)
-
-            html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Stats</title>
-                <style>
-                    * {{ box-sizing: border-box; }}
-                    :root {{
-                        --primary: #667eea;
-                        --primary-dark: #5568d3;
-                        --accent: #764ba2;
-                        --success: #28a745;
-                        --danger: #dc3545;
-                        --warning: #ffc107;
-                        --bg-light: #f8f9fa;
-                        --bg-lighter: #ffffff;
-                        --text-primary: #1a1a1a;
-                        --text-secondary: #555555;
-                        --text-muted: #999999;
-                        --border-color: #eeeeee;
-                        --shadow-sm: 0 2px 4px rgba(0,0,0,0.08);
-                        --shadow-md: 0 4px 12px rgba(0,0,0,0.12);
-                        --shadow-lg: 0 8px 24px rgba(0,0,0,0.15);
-                    }}
-                    body.dark-mode {{
-                        --primary: #8b9fe8;
-                        --primary-dark: #7a8ed7;
-                        --accent: #9d6bc2;
-                        --bg-light: #2a2d3a;
-                        --bg-lighter: #1e1f2b;
-                        --text-primary: #e4e4e7;
-                        --text-secondary: #a1a1aa;
-                        --text-muted: #71717a;
-                        --border-color: #3a3d4a;
-                        background: linear-gradient(135deg, #1e1f2b 0%, #2a2d3a 100%);
-                    }}
-                    body {{ 
-                        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; 
-                        padding: 0; 
-                        max-width: 1200px; 
-                        margin: 0 auto; 
-                        background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-                        min-height: 100vh;
-                        position: relative;
-                        color: var(--text-primary);
-                        overflow-x: hidden;
-                        width: 100%;
-                    }}
-                    html {{
-                        overflow-x: hidden;
-                        max-width: 100%;
-                    }}
-                    /* Premium Toolbar */
-                    .toolbar {{
-                        position: sticky;
-                        top: 0;
-                        z-index: 1000;
-                        background: var(--bg-lighter);
-                        display: flex;
-                        align-items: center;
-                        justify-content: space-between;
-                        padding: 16px 20px;
-                        box-shadow: var(--shadow-md);
-                        border-bottom: 1px solid var(--border-color);
-                        backdrop-filter: blur(10px);
-                        animation: slideDown 0.3s ease-out;
-                    }}
-                    @keyframes slideDown {{
-                        from {{ transform: translateY(-100%); opacity: 0; }}
-                        to {{ transform: translateY(0); opacity: 1; }}
-                    }}
-                    .toolbar-title {{
-                        font-weight: 700;
-                        color: var(--text-secondary);
-                        display: flex;
-                        align-items: center;
-                        gap: 10px;
-                        font-size: 1.25em;
-                        font-family: system-ui, -apple-system, 'Segoe UI', sans-serif;
-                    }}
-                    .toolbar-title::before {{
-                        content: '📈';
-                        font-size: 1.3em;
-                        display: inline-block;
-                        line-height: 1;
-                    }}
-                    }}
-                    .kebab {{
-                        position: relative;
-                    }}
-                    .kebab-btn {{
-                        background: none;
-                        border: none;
-                        font-size: 28px;
-                        line-height: 1;
-                        padding: 8px 12px;
-                        cursor: pointer;
-                        color: var(--text-secondary);
-                        touch-action: manipulation;
-                        -webkit-tap-highlight-color: transparent;
-                        transition: all 0.2s ease;
-                        border-radius: 8px;
-                    }}
-                    .kebab-btn:hover {{
-                        background: var(--bg-light);
-                        color: var(--primary);
-                    }}
-                    .kebab-btn:active {{
-                        background: var(--border-color);
-                        transform: scale(0.95);
-                    }}
-                    .menu {{
-                        position: absolute;
-                        right: 0;
-                        top: 50px;
-                        background: var(--bg-lighter);
-                        border: 1px solid var(--border-color);
-                        border-radius: 12px;
-                        box-shadow: var(--shadow-lg);
-                        min-width: 200px;
-                        display: none;
-                        overflow: hidden;
-                        animation: popIn 0.25s ease-out;
-                    }}
-                    @keyframes popIn {{
-                        from {{ transform: scale(0.9) translateY(-10px); opacity: 0; }}
-                        to {{ transform: scale(1) translateY(0); opacity: 1; }}
-                    }}
-                    .menu.open {{ display: block; }}
-                    .menu a {{
-                        display: flex;
-                        align-items: center;
-                        gap: 10px;
-                        padding: 14px 16px;
-                        text-decoration: none;
-                        color: var(--text-secondary);
-                        font-weight: 600;
-                        border-bottom: 1px solid var(--border-color);
-                        font-size: 0.95em;
-                        transition: all 0.15s ease;
-                    }}
-                    .menu a:last-child {{ border-bottom: none; }}
-                    .menu a:hover {{ 
-                        background: var(--bg-light);
-                        color: var(--primary);
-                        padding-left: 20px;
-                    }}
-                    .menu a:active {{ background: linear-gradient(135deg, rgba(102, 126, 234, 0.1), rgba(118, 75, 162, 0.1)); }}
-                    .menu .danger {{ color: var(--danger); }}
-                    .menu .danger:hover {{ background: rgba(220, 53, 69, 0.1); }}
-                    .content {{ position: relative; z-index: 1; padding: 20px; }}
-                    h1 {{ 
-                        color: var(--text-primary); 
-                        font-size: 1.6em; 
-                        margin: 0 0 20px 0; 
-                        position: relative; 
-                        z-index: 1;
-                        font-weight: 700;
-                    }}
-                    h2 {{ 
-                        color: var(--text-secondary); 
-                        margin-top: 28px; 
-                        margin-bottom: 12px;
-                        font-size: 1.2em; 
-                        position: relative; 
-                        z-index: 1;
-                        font-weight: 600;
-                        cursor: pointer;
-                        user-select: none;
-                        padding: 12px 16px;
-                        background: var(--bg-lighter);
-                        border-radius: 10px;
-                        border: 1px solid var(--border-color);
-                        transition: all 0.2s ease;
-                    }}
-                    h2:hover {{
-                        background: var(--bg-light);
-                        border-color: var(--primary);
-                    }}
-                    h2::after {{
-                        content: '▼';
-                        float: right;
-                        transition: transform 0.3s ease;
-                        font-size: 0.8em;
-                        color: var(--text-muted);
-                    }}
-                    h2.collapsed::after {{
-                        transform: rotate(-90deg);
-                    }}
-                    .section-content {{
-                        max-height: 2000px;
-                        overflow: hidden;
-                        transition: max-height 0.4s ease, opacity 0.3s ease;
-                        opacity: 1;
-                    }}
-                    .section-content.hidden {{
-                        max-height: 0;
-                        opacity: 0;
-                    }}
-                    .chart-container {{ 
-                        background: var(--bg-lighter); 
-                        padding: 20px; 
-                        border-radius: 12px; 
-                        box-shadow: var(--shadow-md); 
-                        margin: 20px 0; 
-                        overflow-x: auto; 
-                        position: relative; 
-                        z-index: 1; 
-                        -webkit-overflow-scrolling: touch;
-                        border: 1px solid var(--border-color);
-                    }}
-                    .chart-scroll {{ min-width: 600px; }}
-                    table {{ 
-                        width: 100%; 
-                        border-collapse: collapse; 
-                        margin-top: 15px; 
-                        background: var(--bg-lighter); 
-                        border-radius: 10px; 
-                        overflow: hidden; 
-                        box-shadow: var(--shadow-sm); 
-                        font-size: 0.9em; 
-                        position: relative; 
-                        z-index: 1;
-                        border: 1px solid var(--border-color);
-                    }}
-                    th, td {{ 
-                        padding: 12px 10px; 
-                        text-align: left; 
-                        border-bottom: 1px solid var(--border-color); 
-                    }}
-                    th {{ 
-                        background: linear-gradient(135deg, var(--primary), var(--accent));
-                        color: white;
-                        font-weight: 700; 
-                        position: sticky; 
-                        top: 0;
-                    }}
-                    .small {{ 
-                        font-size: 0.8em; 
-                        color: var(--text-muted); 
-                    }}
-                    tr:hover {{ 
-                        background: linear-gradient(90deg, rgba(102, 126, 234, 0.05), transparent);
-                    }}
-                    .table-container {{ 
-                        overflow-x: auto; 
-                        -webkit-overflow-scrolling: touch; 
-                        margin-bottom: 24px; 
-                        position: relative; 
-                        z-index: 1;
-                        border-radius: 10px;
-                    }}
-                    .card {{ 
-                        background: var(--bg-lighter); 
-                        padding: 20px; 
-                        border-radius: 12px; 
-                        box-shadow: var(--shadow-md); 
-                        margin: 16px 0; 
-                        position: relative; 
-                        z-index: 1;
-                        border: 1px solid var(--border-color);
-                        transition: all 0.3s ease;
-                        animation: fadeInUp 0.4s ease-out;
-                    }}
-                    @keyframes fadeInUp {{
-                        from {{ transform: translateY(20px); opacity: 0; }}
-                        to {{ transform: translateY(0); opacity: 1; }}
-                    }}
-                    .card:hover {{ 
-                        box-shadow: var(--shadow-lg);
-                        transform: translateY(-2px);
-                    }}
-                    .row-flex {{ display: flex; gap: 16px; flex-wrap: wrap; }}
-                    .row-flex .col {{ flex: 1 1 320px; min-width: 100%; }}
-                    .input-inline {{ display: flex; gap: 10px; align-items: center; flex-wrap: wrap; }}
-                    .input-inline input[type=text] {{ 
-                        flex: 1; 
-                        min-width: 150px; 
-                        padding: 12px 14px; 
-                        border: 2px solid var(--border-color); 
-                        border-radius: 10px; 
-                        font-size: 0.95em;
-                        background: var(--bg-lighter);
-                        color: var(--text-primary);
-                        transition: all 0.2s ease;
-                    }}
-                    .input-inline input[type=text]:focus {{
-                        outline: none;
-                        border-color: var(--primary);
-                        box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-                    }}
-                    .input-inline button {{ 
-                        padding: 12px 20px; 
-                        border: none; 
-                        border-radius: 10px; 
-                        background: linear-gradient(135deg, var(--primary), var(--accent));
-                        color: white; 
-                        font-weight: 700; 
-                        cursor: pointer; 
-                        white-space: nowrap;
-                        transition: all 0.2s ease;
-                        box-shadow: var(--shadow-sm);
-                    }}
-                    .input-inline button:hover {{ 
-                        box-shadow: var(--shadow-md);
-                        transform: translateY(-2px);
-                    }}
-                    .input-inline button:active {{ 
-                        transform: translateY(0);
-                    }}
-                    ul.clean {{ list-style: none; padding: 0; margin: 0; }}
-                    .stat {{ 
-                        background: linear-gradient(135deg, var(--bg-lighter), rgba(102, 126, 234, 0.02)); 
-                        padding: 20px; 
-                        border-radius: 12px; 
-                        box-shadow: var(--shadow-md); 
-                        margin: 14px 0; 
-                        display: flex; 
-                        justify-content: space-between; 
-                        align-items: center; 
-                        position: relative; 
-                        z-index: 1;
-                        border: 1px solid var(--border-color);
-                        transition: all 0.3s ease;
-                        animation: slideIn 0.4s ease-out;
-                    }}
-                    @keyframes slideIn {{
-                        from {{ transform: translateX(-20px); opacity: 0; }}
-                        to {{ transform: translateX(0); opacity: 1; }}
-                    }}
-                    .stat:hover {{
-                        box-shadow: var(--shadow-lg);
-                        transform: translateX(8px);
-                    }}
-                    .stat-label {{ 
-                        font-weight: 600; 
-                        color: var(--text-secondary); 
-                        font-size: 0.95em;
-                    }}
-                    .stat-value {{ 
-                        font-size: 2em; 
-                        font-weight: 800; 
-                        background: linear-gradient(135deg, var(--primary), var(--accent));
-                        -webkit-background-clip: text;
-                        -webkit-text-fill-color: transparent;
-                        background-clip: text;
-                    }}
-                    h1, h2 {{ color: var(--text-primary); margin-top: 25px; position: relative; z-index: 1; }}
-                    h3 {{ margin: 0 0 12px 0; font-size: 1.1em; color: var(--text-secondary); font-weight: 600; }}
-                    /* Stats Cards */
-                    .stats-grid {{
-                        display: grid;
-                        grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-                        gap: 16px;
-                        margin: 20px 0;
-                    }}
-                    .stat-card {{
-                        background: linear-gradient(135deg, var(--bg-lighter), rgba(102, 126, 234, 0.05));
-                        padding: 24px;
-                        border-radius: 12px;
-                        border: 1px solid var(--border-color);
-                        text-align: center;
-                        transition: all 0.3s ease;
-                        box-shadow: var(--shadow-sm);
-                    }}
-                    .stat-card:hover {{
-                        transform: translateY(-4px);
-                        box-shadow: var(--shadow-lg);
-                    }}
-                    .stat-card-value {{
-                        font-size: 2.5em;
-                        font-weight: 800;
-                        background: linear-gradient(135deg, var(--primary), var(--accent));
-                        -webkit-background-clip: text;
-                        -webkit-text-fill-color: transparent;
-                        background-clip: text;
-                        margin: 8px 0;
-                    }}
-                    .stat-card-label {{
-                        font-size: 0.9em;
-                        color: var(--text-secondary);
-                        font-weight: 600;
-                        text-transform: uppercase;
-                        letter-spacing: 0.5px;
-                    }}
-                    .stat-card-icon {{
-                        font-size: 2em;
-                        margin-bottom: 8px;
-                    }}
-                    /* Dark Mode Toggle (toolbar içinde, kebab yanında) */
-                    .toolbar-actions {{
-                        display: flex;
-                        align-items: center;
-                        gap: 10px;
-                    }}
-                    .theme-toggle {{
-                        position: static;
-                        background: var(--bg-light);
-                        color: var(--text-secondary);
-                        border: 1px solid var(--border-color);
-                        width: 42px;
-                        height: 42px;
-                        border-radius: 10px;
-                        font-size: 18px;
-                        cursor: pointer;
-                        box-shadow: none;
-                        transition: background 0.15s ease, color 0.15s ease, transform 0.2s ease;
-                        display: inline-flex;
-                        align-items: center;
-                        justify-content: center;
-                        touch-action: manipulation;
-                        -webkit-tap-highlight-color: transparent;
-                    }}
-                    .theme-toggle:hover {{
-                        color: var(--primary);
-                        transform: rotate(180deg);
-                    }}
-                    .theme-toggle:active {{
-                        transform: scale(0.95);
-                    }}
-                    /* Browser & Device Stats */
-                    .browser-stats, .device-stats {{
-                        display: flex;
-                        flex-direction: column;
-                        gap: 8px;
-                    }}
-                    .browser-stats .stat, .device-stats .stat {{
-                        animation: none; /* Override slideIn for these specific stats */
-                    }}
-                    @media (max-width: 768px) {{
-                        .toolbar-title {{ font-size: 1.1em; }}
-                        .content {{ padding: 16px; }}
-                        h1 {{ font-size: 1.3em; margin: 0 0 16px 0; }}
-                        h2 {{ font-size: 1.1em; margin-top: 20px; }}
-                        .stat {{ padding: 16px; margin: 12px 0; gap: 12px; }}
-                        .stat-label {{ font-size: 0.9em; }}
-                        .stat-value {{ font-size: 1.6em; }}
-                        .stat-label, .stat-value {{ white-space: nowrap; }}
-                        .card {{ padding: 16px; margin: 12px 0; }}
-                        .row-flex {{ gap: 12px; }}
-                        .row-flex .col {{ flex: 1 1 100%; min-width: 100%; }}
-                        table {{ font-size: 0.85em; }}
-                        th, td {{ padding: 10px 8px; }}
-                        .input-inline {{ gap: 8px; }}
-                        .input-inline input[type=text] {{ padding: 12px; font-size: 16px; }}
-                        .input-inline button {{ padding: 12px 16px; font-size: 0.95em; }}
-                        .theme-toggle {{ width: 38px; height: 38px; border-radius: 10px; font-size: 17px; }}
-                    }}
-                    @media (max-width: 480px) {{
-                        body {{ padding: 0; }}
-                        .toolbar {{ padding: 12px 14px; gap: 10px; }}
-                        .toolbar-title {{ font-size: 1em; }}
-                        .kebab-btn {{ font-size: 24px; padding: 6px 8px; }}
-                        .theme-toggle {{ width: 36px; height: 36px; border-radius: 10px; font-size: 16px; }}
-                        .content {{ padding: 12px; }}
-                        h1 {{ font-size: 1.15em; margin: 0 0 14px 0; }}
-                        h2 {{ font-size: 1em; margin-top: 16px; margin-bottom: 10px; }}
-                        h3 {{ font-size: 1em; }}
-                        .stat {{ padding: 14px; margin: 10px 0; gap: 10px; flex-direction: column; align-items: flex-start; }}
-                        .stat-label {{ font-size: 0.9em; }}
-                        .stat-value {{ font-size: 1.5em; align-self: flex-end; }}
-                        .card {{ padding: 14px; margin: 10px 0; }}
-                        .row-flex {{ gap: 0; flex-direction: column; }}
-                        .row-flex .col {{ min-width: 100%; }}
-                        table {{ font-size: 0.8em; }}
-                        th, td {{ padding: 8px 6px; }}
-                        .small {{ font-size: 0.7em; }}
-                        .input-inline {{ gap: 6px; flex-direction: column; }}
-                        .input-inline input[type=text] {{ width: 100%; padding: 12px; font-size: 16px; }}
-                        .input-inline button {{ width: 100%; padding: 12px; font-size: 0.95em; }}
-                        .menu {{ min-width: 160px; font-size: 0.9em; }}
-                        .menu a {{ padding: 12px 14px; }}
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="toolbar">
-                    <div class="toolbar-title">Admin</div>
-                    <div class="toolbar-actions">
-                        <button id="themeToggle" class="theme-toggle" aria-label="Theme wechseln" type="button">
-                            <span class="theme-icon">🌙</span>
-                        </button>
-                        <div class="kebab">
-                            <button class="kebab-btn" id="kebabBtn" aria-label="Menü" type="button">⋮</button>
-                            <div class="menu" id="kebabMenu">
-                                <a href="/">⌂ Startseite</a>
-                                <a href="/stats/delete-past">✕ Löschen</a>
-                                <a href="/stats/logout" class="danger">⎋ Abmelden</a>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-                <div class="content">
-                <!-- İstatistik Özeti Kartları -->
-                <div class="stats-grid">
-                    <div class="stat-card">
-                        <div class="stat-card-icon">📊</div>
-                        <div class="stat-card-value">{total_exams}</div>
-                        <div class="stat-card-label">Prüfungen gesamt</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-card-icon">📅</div>
-                        <div class="stat-card-value">{upcoming_exams}</div>
-                        <div class="stat-card-label">Bevorstehend</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-card-icon">✅</div>
-                        <div class="stat-card-value">{past_exams}</div>
-                        <div class="stat-card-label">Vergangen</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-card-icon">🗓️</div>
-                        <div class="stat-card-value">{this_month_exams}</div>
-                        <div class="stat-card-label">Diesen Monat</div>
-                    </div>
-                </div>
-                
-                <h2 data-toggle="section2">📚 Fächer-Pool</h2>
-                <div id="section2" class="section-content">
-                <div class="card">
-                    <div class="row-flex">
-                        <div class="col">
-                            <h3 style="margin:0 0 8px 0;font-size:1.05em;color:#555">Neues Fach hinzufügen</h3>
-                            <form method="post" action="/stats/subjects/add" class="input-inline">
-                                <input type="text" name="subject_name" placeholder="z.B. Biologie" maxlength="64" required>
-                                <button type="submit">Hinzufügen</button>
-                            </form>
-                            <div class="small" style="margin-top:6px;color:#666">Hinzugefügte Fächer erscheinen im Hinzufügen-Dialog auf der Startseite.</div>
-                        </div>
-                        <div class="col">
-                            <h3 style="margin:0 0 8px 0;font-size:1.05em;color:#555">Vorhandene Fächer</h3>
-                            <ul class="clean">{items_html or "<li style='color:#666'>Noch keine Fächer hinzugefügt.</li>"}</ul>
-                        </div>
-                    </div>
-                </div>
-                </div>
-
-                <h2 data-toggle="section6">🍎 Obst-Planung</h2>
-                <div id="section6" class="section-content">
-                <div class="card">
-                    <h3 style="margin:0 0 8px 0;font-size:1.05em;color:#555">Einträge verwalten</h3>
-                    <div class="small" style="margin-bottom:10px;color:#666">Hier kannst du Obst-Einträge löschen (z.B. Testeinträge).</div>
-                    <div class="table-container" style="margin-bottom:0">
-                        <table>
-                            <tr><th>Datum</th><th>Name</th><th style="text-align:right">Aktion</th></tr>
-                            {obst_table_html or "<tr><td colspan='3' class='small' style='color:#999'>Keine Einträge</td></tr>"}
-                        </table>
-                    </div>
-                </div>
-                </div>
-            """
-            html += """
-
-                <script>
-                    // Accordion toggle
-                    (function(){
-                        const headers = document.querySelectorAll('[data-toggle]');
-                        headers.forEach(header => {
-                            header.addEventListener('click', function() {
-                                const targetId = this.getAttribute('data-toggle');
-                                const content = document.getElementById(targetId);
-                                if (content) {
-                                    content.classList.toggle('hidden');
-                                    this.classList.toggle('collapsed');
-                                }
-                            });
-                        });
-                    })();
-                    
-                    // Kebab menu
-                    (function(){
-                        const btn = document.getElementById('kebabBtn');
-                        const menu = document.getElementById('kebabMenu');
-                        function close(){ menu.classList.remove('open'); }
-                        btn.addEventListener('click', function(e){
-                            e.stopPropagation();
-                            menu.classList.toggle('open');
-                        });
-                        document.addEventListener('click', close);
-                        window.addEventListener('resize', close);
-                    })();
-                    
-                    // Dark Mode Toggle
-                    (function() {
-                        const themeToggle = document.getElementById('themeToggle');
-                        if (!themeToggle) return;
-                        const icon = themeToggle.querySelector('.theme-icon');
-                        if (!icon) return;
-                        
-                        // Kayıtlı tema tercihini yükle
-                        const savedTheme = localStorage.getItem('theme');
-                        if (savedTheme === 'dark') {
-                            document.body.classList.add('dark-mode');
-                            icon.textContent = '☀️';
-                        }
-                        
-                        // Toggle butonu click event
-                        themeToggle.addEventListener('click', function() {
-                            document.body.classList.toggle('dark-mode');
-                            const isDark = document.body.classList.contains('dark-mode');
-                            localStorage.setItem('theme', isDark ? 'dark' : 'light');
-                            icon.textContent = isDark ? '☀️' : '🌙';
-                        });
-                    })();
-                </script>
-            </body>
-            </html>
-            """
-            return html
+                obst_entries = []
+        # Ders listesi (yönetim) - paylaşılan katalogdan
+        subjects = get_subject_catalog()['entries']
+        return render_template('stats.html', stats=exam_stats, subjects=subjects,
+                               obst_entries=obst_entries)
     except Exception as e:
         return f"Fehler: {e}", 500
 
 # Basit tarayıcılar 401 kodlu sayfaları boş gösterebileceği için
 # yukarıda tanımlanan `stats_login` rotası aynı formu 200 OK ile sunar.
 
-@login_required
 @app.route('/stats/update-credentials', methods=['POST'])
+@login_required
 def update_credentials():
     return redirect(url_for('stats'))
 
@@ -2181,8 +2996,8 @@ def admin_info():
         "note": "Das Passwort wird als Hash gespeichert und kann nicht angezeigt werden. Du kannst es über /admin/reset aktualisieren."
     })
 
-@login_required
 @app.route('/stats/subjects/add', methods=['POST'])
+@login_required
 def stats_subjects_add():
     name = (request.form.get('subject_name') or '').strip()
     if not name:
@@ -2198,8 +3013,8 @@ def stats_subjects_add():
         pass
     return redirect(url_for('stats'))
 
-@login_required
 @app.route('/stats/subjects/delete', methods=['POST'])
+@login_required
 def stats_subjects_delete():
     sid = (request.form.get('subject_id') or '').strip()
     if not sid:
@@ -2213,8 +3028,8 @@ def stats_subjects_delete():
     return redirect(url_for('stats'))
 
 
-@login_required
 @app.route('/stats/obst/delete', methods=['POST'])
+@login_required
 def stats_obst_delete():
     oid_raw = (request.form.get('obst_id') or '').strip()
     oid = int(oid_raw) if oid_raw.isdigit() else 0
@@ -2229,20 +3044,16 @@ def stats_obst_delete():
     return redirect(url_for('stats'))
 
 # -------------------- Stats JSON Endpoint --------------------
-@login_required
 @app.route('/stats/json')
+@login_required
 def stats_json():
-    """İstemci uygulaması için JSON formatında istatistikler (ziyaret/IP kaydı yok)."""
+    """İstemci uygulaması için JSON formatında istatistikler (ziyaret/IP kaydı yok).
+
+    Sayaçlar + ders/ay/sınıf kırılımları tek belge, tek sorgu.
+    """
     try:
         with get_db_connection() as conn:
-            total_exams = conn.execute("SELECT COUNT(*) FROM exams").fetchone()[0]
-            upcoming_exams = conn.execute("SELECT COUNT(*) FROM exams WHERE date >= date('now')").fetchone()[0]
-            past_exams = conn.execute("SELECT COUNT(*) FROM exams WHERE date < date('now')").fetchone()[0]
-        return jsonify({
-            'total_exams': total_exams,
-            'upcoming_exams': upcoming_exams,
-            'past_exams': past_exams
-        })
+            return jsonify(compute_exam_stats(conn))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -2253,7 +3064,8 @@ def logout():
 
 # -------------------- Local çalıştırma --------------------
 if __name__ == "__main__":
-    init_db()
+    reset_metrics()
+    init_app()
     print("🚀 Starting Flask (dev)")
     # Ortamdan PORT değişkeni okunarak esnek port seçimi
     try:
@@ -0,0 +1,100 @@
+"""Tatil arka planı mikro-benchmark'ı: eski gün gün döngü vs. kapalı form hafta içi blokları.
+
+Çalıştırma:  python bench_holidays.py [yıl_sayısı]
+"""
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+# app import edilirken gerçek DB'ye dokunmasın
+os.environ.setdefault("SQLITE_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+os.environ.setdefault("HOLIDAY_REFRESH_ENABLED", "0")
+import app  # noqa: E402
+
+
+def legacy_add_weekday_background_ranges(start_str, end_exclusive_str, added_pairs, events_list):
+    """events() içindeki eski add_weekday_background_ranges döngüsünün birebir kopyası."""
+    appended = 0
+    try:
+        d = datetime.strptime(start_str, "%Y-%m-%d")
+        end_ex = datetime.strptime(end_exclusive_str, "%Y-%m-%d")
+    except Exception:
+        return 0
+    run_start = None
+    while d < end_ex:
+        if d.weekday() < 5:
+            if run_start is None:
+                run_start = d
+        else:
+            if run_start is not None:
+                s = run_start.strftime("%Y-%m-%d")
+                e = d.strftime("%Y-%m-%d")
+                key = (s, e)
+                if key not in added_pairs:
+                    added_pairs.add(key)
+                    events_list.append({'start': s, 'end': e, 'rendering': 'background',
+                                        'backgroundColor': '#f0f0f0', 'display': 'background'})
+                    appended += 1
+                run_start = None
+        d += timedelta(days=1)
+    if run_start is not None:
+        s = run_start.strftime("%Y-%m-%d")
+        e = end_ex.strftime("%Y-%m-%d")
+        key = (s, e)
+        if key not in added_pairs:
+            added_pairs.add(key)
+            events_list.append({'start': s, 'end': e, 'rendering': 'background',
+                                'backgroundColor': '#f0f0f0', 'display': 'background'})
+            appended += 1
+    return appended
+
+
+def make_holidays(first_year, years):
+    """Bayern'e benzer yıllık tatil takvimi (end inclusive)."""
+    holidays = []
+    for y in range(first_year, first_year + years):
+        holidays += [
+            {"start": f"{y}-02-16", "end": f"{y}-02-20"},
+            {"start": f"{y}-03-30", "end": f"{y}-04-10"},
+            {"start": f"{y}-05-26", "end": f"{y}-06-05"},
+            {"start": f"{y}-08-01", "end": f"{y}-09-14"},
+            {"start": f"{y}-11-02", "end": f"{y}-11-06"},
+            {"start": f"{y}-12-23", "end": f"{y + 1}-01-05"},
+        ]
+    return holidays
+
+
+def run_legacy(holidays):
+    added_pairs, events_list = set(), []
+    for h in holidays:
+        end_str = (datetime.strptime(h['end'], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        legacy_add_weekday_background_ranges(h['start'], end_str, added_pairs, events_list)
+    return events_list
+
+
+def run_closed_form(holidays):
+    spans = [(app._date_ordinal(h['start']), app._date_ordinal(h['end']) + 1) for h in holidays]
+    return app._background_events_for_runs(app._weekday_runs(spans))
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    holidays = make_holidays(2020, years)
+
+    legacy = sorted((e['start'], e['end']) for e in run_legacy(holidays))
+    closed = sorted((e['start'], e['end']) for e in run_closed_form(holidays))
+    assert legacy == closed, "Sonuçlar farklı!"
+
+    number = 200
+    t_legacy = min(timeit.repeat(lambda: run_legacy(holidays), number=number, repeat=5)) / number
+    t_closed = min(timeit.repeat(lambda: run_closed_form(holidays), number=number, repeat=5)) / number
+    print(f"{years} yıl, {len(holidays)} tatil, {len(closed)} hafta içi blok")
+    print(f"eski döngü   : {t_legacy * 1e6:9.1f} µs")
+    print(f"kapalı form  : {t_closed * 1e6:9.1f} µs")
+    print(f"hızlanma     : {t_legacy / t_closed:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
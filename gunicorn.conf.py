@@ -0,0 +1,22 @@
+# Gunicorn ayarları (gunicorn bu dosyayı çalışma dizininden otomatik okur).
+# DB kurulumu master process'te worker'lar trafiğe açılmadan önce bir kez yapılır;
+# her worker fork'tan sonra kendi arka plan thread'lerini başlatır.
+import os
+
+# /events/stream (SSE) bağlantıları dakikalarca açık kalır: sync worker'da hem
+# tüm worker'ı bloklar hem de timeout ile öldürülür. gthread'de her akış tek bir
+# thread kullanır (EVENTS_STREAM_MAX_CLIENTS bunun üst sınırı).
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+
+def on_starting(server):
+    import app
+    # Önceki çalıştırmadan kalan worker metrik dosyaları toplamı şişirmesin
+    app.reset_metrics()
+    app.init_db()
+
+
+def post_fork(server, worker):
+    import app
+    app.start_background_workers()
@@ -0,0 +1,50 @@
+// Accordion toggle
+(function(){
+    const headers = document.querySelectorAll('[data-toggle]');
+    headers.forEach(header => {
+        header.addEventListener('click', function() {
+            const targetId = this.getAttribute('data-toggle');
+            const content = document.getElementById(targetId);
+            if (content) {
+                content.classList.toggle('hidden');
+                this.classList.toggle('collapsed');
+            }
+        });
+    });
+})();
+
+// Kebab menu
+(function(){
+    const btn = document.getElementById('kebabBtn');
+    const menu = document.getElementById('kebabMenu');
+    function close(){ menu.classList.remove('open'); }
+    btn.addEventListener('click', function(e){
+        e.stopPropagation();
+        menu.classList.toggle('open');
+    });
+    document.addEventListener('click', close);
+    window.addEventListener('resize', close);
+})();
+
+// Dark Mode Toggle
+(function() {
+    const themeToggle = document.getElementById('themeToggle');
+    if (!themeToggle) return;
+    const icon = themeToggle.querySelector('.theme-icon');
+    if (!icon) return;
+
+    // Kayıtlı tema tercihini yükle
+    const savedTheme = localStorage.getItem('theme');
+    if (savedTheme === 'dark') {
+        document.body.classList.add('dark-mode');
+        icon.textContent = '☀️';
+    }
+
+    // Toggle butonu click event
+    themeToggle.addEventListener('click', function() {
+        document.body.classList.toggle('dark-mode');
+        const isDark = document.body.classList.contains('dark-mode');
+        localStorage.setItem('theme', isDark ? 'dark' : 'light');
+        icon.textContent = isDark ? '☀️' : '🌙';
+    });
+})();
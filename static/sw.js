@@ -1,5 +1,5 @@
 // Service Worker - Offline Mode
-const CACHE_NAME = 'prufungskalender-v1';
+const CACHE_NAME = 'prufungskalender-v4';
 const urlsToCache = [
   '/',
   '/index.html',
@@ -57,22 +57,27 @@ self.addEventListener('fetch', event => {
     return;
   }
 
-  // API endpoints - Cache first, network fallback
-  if (url.pathname === '/events' || url.pathname === '/api/subjects') {
+  // SSE akışları her zaman doğrudan ağa gider (cache'lenirse bayat akış tekrar oynatılır)
+  if (url.pathname === '/events/stream' || (request.headers.get('accept') || '').includes('text/event-stream')) {
+    return;
+  }
+
+  // API endpoints - Network first, cache fallback (offline)
+  // Sunucu ETag + data_version ile 304 döndüğü için ağ isteği ucuz; önbellek
+  // yalnızca çevrimdışıyken eski veriyi göstermek için.
+  if (url.pathname === '/events' || url.pathname === '/api/subjects' ||
+      url.pathname === '/api/subjects/search' || url.pathname === '/api/version') {
     event.respondWith(
-      caches.match(request)
+      fetch(request)
         .then(response => {
-          if (response) return response;
-          return fetch(request).then(response => {
-            if (!response || response.status !== 200) {
-              return response;
-            }
-            const responseClone = response.clone();
-            caches.open(CACHE_NAME).then(cache => {
-              cache.put(request, responseClone);
-            });
+          if (!response || response.status !== 200) {
             return response;
+          }
+          const responseClone = response.clone();
+          caches.open(CACHE_NAME).then(cache => {
+            cache.put(request, responseClone);
           });
+          return response;
         })
         .catch(() => {
           // İnternet yok, cache'deki veri var ise kullan